@@ -1,6 +1,7 @@
-async function updateStock(medicineId) {
-    // Get the form for this specific medicine
-    const form = document.getElementById(`stockForm${medicineId}`);
+async function updateStock() {
+    // The shared stock modal holds the medicine picked from the table
+    const form = document.getElementById('stockForm');
+    const medicineId = form.elements['medicine_id'].value;
     const formData = new FormData(form);
     
     // Show loading state
@@ -21,14 +22,9 @@ async function updateStock(medicineId) {
             // Show success message
             alert('Stock updated successfully!');
             
-            // Close modal and reload page to see changes
-            const modal = bootstrap.Modal.getInstance(document.getElementById(`stockModal${medicineId}`));
-            modal.hide();
-            
-            // Reload the page to reflect changes
-            setTimeout(() => {
-                location.reload();
-            }, 500);
+            // Close modal and refresh the table to see changes
+            bootstrap.Modal.getInstance(document.getElementById('stockModal')).hide();
+            loadMedicineTable(location.search);
             
         } else {
             alert('Error: ' + result.error);
@@ -43,12 +39,141 @@ async function updateStock(medicineId) {
     }
 }
 
-// Alternative version if you prefer the original onsubmit approach:
-function handleStockUpdate(event, medicineId) {
+function handleStockUpdate(event) {
     event.preventDefault();
-    updateStock(medicineId);
+    updateStock();
+}
+
+// Fill the shared stock modal from the row's Stock button
+function setupStockModal(modal) {
+    modal.addEventListener('show.bs.modal', event => {
+        const button = event.relatedTarget;
+        const form = document.getElementById('stockForm');
+        form.reset();
+        form.elements['medicine_id'].value = button.dataset.medicineId;
+        modal.querySelector('[data-field="name"]').textContent = button.dataset.name;
+        modal.querySelector('[data-field="quantity"]').textContent = button.dataset.quantity;
+    });
+}
+
+// Replace the medicine table and totals with another page or sort order
+async function loadMedicineTable(search) {
+    const container = document.getElementById('medicineTable');
+    try {
+        const response = await fetch(container.dataset.tableUrl + search);
+        const result = await response.json();
+        container.innerHTML = result.html;
+        Object.entries(result.totals).forEach(([name, value]) => {
+            const element = document.querySelector(`[data-total="${name}"]`);
+            if (element) {
+                const currency = element.dataset.currency;
+                element.textContent = currency ? currency + value.toFixed(2) : value;
+            }
+        });
+    } catch (error) {
+        console.error('Error:', error);
+        location.reload();
+    }
+}
+
+function setupMedicineTable(container) {
+    container.addEventListener('click', event => {
+        const link = event.target.closest('a[data-table-link]');
+        if (!link) {
+            return;
+        }
+        event.preventDefault();
+        history.pushState(null, '', link.href);
+        loadMedicineTable(link.search);
+    });
+    window.addEventListener('popstate', () => loadMedicineTable(location.search));
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const modal = document.getElementById('stockModal');
+    if (modal) {
+        setupStockModal(modal);
+    }
+    const table = document.getElementById('medicineTable');
+    if (table) {
+        setupMedicineTable(table);
+    }
+});
+
+// Typeahead suggestions for the medicine search box
+function setupTypeahead(input) {
+    const datalist = document.getElementById(input.getAttribute('list'));
+    let timer = null;
+    let controller = null;
+    
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (query.length < 2) {
+            datalist.innerHTML = '';
+            return;
+        }
+        
+        timer = setTimeout(async () => {
+            // Drop the response of a request the user has already typed past
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            
+            try {
+                const response = await fetch(`/api/medicines/search?q=${encodeURIComponent(query)}`, {
+                    signal: controller.signal
+                });
+                const medicines = await response.json();
+                datalist.innerHTML = '';
+                medicines.forEach(medicine => {
+                    const option = document.createElement('option');
+                    option.value = medicine.name;
+                    option.label = `${medicine.batch_number} - ${medicine.category}`;
+                    datalist.appendChild(option);
+                });
+            } catch (error) {
+                if (error.name !== 'AbortError') {
+                    console.error('Error:', error);
+                }
+            }
+        }, 150);
+    });
 }
 
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-typeahead]').forEach(setupTypeahead);
+});
+
+// Low stock and expiry alerts pushed by the server while any page is open
+const ALERT_MESSAGES = {
+    low_stock: alert => `Low stock: ${alert.name} (${alert.batch_number}) is down to ${alert.quantity}`,
+    expiring_soon: alert => `Expiring soon: ${alert.name} (${alert.batch_number}) expires on ${alert.expiry_date}`
+};
+
+function showLiveAlert(alert) {
+    const container = document.getElementById('liveAlerts');
+    const element = document.createElement('div');
+    element.className = `alert ${alert.type === 'low_stock' ? 'alert-danger' : 'alert-warning'} alert-dismissible fade show`;
+    element.setAttribute('role', 'alert');
+    element.textContent = ALERT_MESSAGES[alert.type](alert);
+    const close = document.createElement('button');
+    close.type = 'button';
+    close.className = 'btn-close';
+    close.dataset.bsDismiss = 'alert';
+    element.appendChild(close);
+    container.prepend(element);
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    const url = document.body.dataset.alertsUrl;
+    if (url && window.EventSource) {
+        const source = new EventSource(url);
+        source.addEventListener('alert', event => showLiveAlert(JSON.parse(event.data)));
+    }
+});
+
 // Auto-hide alerts after 5 seconds
 document.addEventListener('DOMContentLoaded', function() {
     setTimeout(() => {
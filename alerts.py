@@ -0,0 +1,97 @@
+from database import db
+from models import Medicine, Alert, ExpirySweep
+from datetime import datetime, date, timedelta
+import json
+import time
+
+EXPIRY_WINDOW_DAYS = 30
+ALERT_BATCH_SIZE = 100
+
+# Alerts a medicine currently raises, same thresholds as the dashboard lists
+def alert_kinds(medicine, today=None):
+    today = today or date.today()
+    kinds = set()
+    if medicine.quantity <= medicine.low_stock_alert:
+        kinds.add('low_stock')
+    if today <= medicine.expiry_date <= today + timedelta(days=EXPIRY_WINDOW_DAYS):
+        kinds.add('expiring_soon')
+    return kinds
+
+def alert_payload(kind, medicine):
+    return {
+        'type': kind,
+        'medicine_id': medicine.id,
+        'name': medicine.name,
+        'batch_number': medicine.batch_number,
+        'quantity': medicine.quantity,
+        'low_stock_alert': medicine.low_stock_alert,
+        'expiry_date': medicine.expiry_date.isoformat(),
+    }
+
+def _add_alert(user_id, kind, medicine):
+    db.session.add(Alert(user_id=user_id, payload=json.dumps(alert_payload(kind, medicine))))
+
+# Call after committing a write to a medicine; publishes the alerts it raises
+# now that it did not raise before (the result of alert_kinds before the write)
+def publish_new_alerts(medicine, before):
+    kinds = sorted(alert_kinds(medicine) - before)
+    for kind in kinds:
+        _add_alert(medicine.user_id, kind, medicine)
+    if kinds:
+        db.session.commit()
+
+# Run after the day's expiry sweep: medicines that entered the expiry window
+# since the last day alerts were published for alert their users, so a
+# restart publishes nothing twice and days the scheduler missed are caught up.
+# The day is recorded on the sweep. Returns how many alerts were published.
+def publish_daily_alerts(sweep, today=None):
+    today = today or date.today()
+    last_day = db.session.scalar(db.select(db.func.max(ExpirySweep.alerts_through)))
+    if last_day is not None and last_day >= today:
+        return 0
+    window = timedelta(days=EXPIRY_WINDOW_DAYS)
+    since = (last_day if last_day is not None else today - timedelta(days=1)) + window
+    entering = Medicine.query.filter(Medicine.expiry_date > since, Medicine.expiry_date <= today + window).all()
+    for medicine in entering:
+        _add_alert(medicine.user_id, 'expiring_soon', medicine)
+    sweep.alerts_through = today
+    db.session.commit()
+    return len(entering)
+
+def prune_alerts(keep_days):
+    cutoff = datetime.utcnow() - timedelta(days=keep_days)
+    db.session.execute(db.delete(Alert).where(Alert.created_at < cutoff))
+    db.session.commit()
+
+# Server-Sent Events for one browser tab, run inside the request context.
+# Alerts are rows in the alert table, so they reach the stream whichever
+# process published them: every poll seconds the stream sends the user's rows
+# after the last id it sent, starting after last_id (the Last-Event-ID a
+# reconnecting browser gives) or after the newest row. The session is closed
+# between polls so an idle stream holds no connection. A comment line goes
+# out every keepalive seconds so dropped connections are noticed.
+def stream_alerts(user_id, keepalive, poll, last_id=None):
+    if last_id is None:
+        last_id = db.session.scalar(db.select(db.func.max(Alert.id)).where(Alert.user_id == user_id)) or 0
+    db.session.close()
+    yield f'retry: {keepalive * 1000}\n\n'
+    quiet = 0
+    while True:
+        alerts = db.session.execute(
+            db.select(Alert.id, Alert.payload)
+            .where(Alert.user_id == user_id, Alert.id > last_id)
+            .order_by(Alert.id).limit(ALERT_BATCH_SIZE)
+        ).all()
+        db.session.close()
+        for alert_id, payload in alerts:
+            yield f'id: {alert_id}\nevent: alert\ndata: {payload}\n\n'
+            last_id = alert_id
+        if len(alerts) == ALERT_BATCH_SIZE:
+            continue
+        if alerts:
+            quiet = 0
+        elif quiet >= keepalive:
+            yield ': keepalive\n\n'
+            quiet = 0
+        time.sleep(poll)
+        quiet += poll
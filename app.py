@@ -1,46 +1,73 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, Blueprint, Response, current_app, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from database import db
-from models import User, Medicine, Transaction, Sale, ExpiredMedicine
-from datetime import datetime, date, timedelta
+from config import Config
+from database import db, engine_options, configure_engine
+from models import User, Medicine, Transaction, Sale, ArchivedTransaction, ArchivedSale, ExpiredMedicine
+from summary import (adjust_summary, create_summary, touch_inventory, get_summary, get_day_sales,
+                     get_total_sales, rebuild_summary, check_summary)
+from expiry import sweep_expired_medicines, start_expiry_scheduler
+from ledger_archive import archive_ledger
+from bulk_inventory import parse_selection, parse_changes, bulk_update, delete_medicines, dispose_expired
+from stock_snapshots import parse_as_of, stock_as_of, reconcile_stock, take_stock_snapshot
+from alerts import EXPIRY_WINDOW_DAYS, alert_kinds, publish_new_alerts, stream_alerts
+from pagination import history_filters, apply_date_range, keyset_page, parse_per_page, parse_date
+from migrations import upgrade_database
+from query_plans import find_full_scans
+from search import filter_by_search, search_medicines, rebuild_search_index
+from medicine_feed import parse_fields, feed_statement, generate_feed
+from stock_import import validate_medicine, import_medicines, iter_import_rows, detect_format
+from checkout import change_stock, parse_lines, checkout
+from sales_report import sales_report, MAX_TOP
+from ledger_export import EXPORTS, EXPORT_FORMATS, export_statements, generate_export, gzip_chunks
+from user_cache import user_cache
+from passwords import password_hasher
+from page_cache import page_cache, cached_page
+from metrics import metrics
+from datetime import datetime, date, timedelta, timezone
+import click
+import hashlib
+import os
 import re
 import sqlite3
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///medicine_tracker.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db.init_app(app)
+bp = Blueprint('main', __name__, cli_group=None)
 
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'main.login'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.get(int(user_id), lambda user_id: db.session.get(User, user_id))
+
+CATEGORIES = ['tablet', 'syrup', 'capsule', 'ointment', 'injection', 'drops', 'inhaler', 'cream', 'gel', 'powder']
+
+# Sidebar links as (name, endpoint, icon)
+NAVIGATION = (
+    ('Dashboard', 'main.dashboard', 'fas fa-tachometer-alt'),
+    ('All Medicines', 'main.medicines', 'fas fa-pills'),
+    ('Add Medicine', 'main.add_medicine', 'fas fa-plus'),
+    ('Import', 'main.import_medicines_page', 'fas fa-file-import'),
+    ('Expired Medicines', 'main.expired_medicines', 'fas fa-exclamation-triangle'),
+    ('Sales', 'main.sales', 'fas fa-shopping-cart'),
+    ('Transactions', 'main.transactions', 'fas fa-exchange-alt'),
+)
+
+# Built navigation links per script root; they only change with where the app is mounted
+_navigation_links = {}
 
-@app.context_processor
+@bp.app_context_processor
 def inject_current_date():
-    from datetime import date
     return {'current_date': date.today()}
 
 # Inject navigation links and categories to all templates
-@app.context_processor
+@bp.app_context_processor
 def inject_navigation():
-    categories = ['tablet', 'syrup', 'capsule', 'ointment', 'injection', 'drops', 'inhaler', 'cream', 'gel', 'powder']
-    return {
-        'navigation': [
-            {'name': 'Dashboard', 'url': url_for('dashboard'), 'icon': 'fas fa-tachometer-alt'},
-            {'name': 'All Medicines', 'url': url_for('medicines'), 'icon': 'fas fa-pills'},
-            {'name': 'Add Medicine', 'url': url_for('add_medicine'), 'icon': 'fas fa-plus'},
-            {'name': 'Expired Medicines', 'url': url_for('expired_medicines'), 'icon': 'fas fa-exclamation-triangle'},
-            {'name': 'Sales', 'url': url_for('sales'), 'icon': 'fas fa-shopping-cart'},
-            {'name': 'Transactions', 'url': url_for('transactions'), 'icon': 'fas fa-exchange-alt'},
-        ],
-        'categories': categories
-    }
+    navigation = _navigation_links.get(request.script_root)
+    if navigation is None:
+        navigation = _navigation_links[request.script_root] = [
+            {'name': name, 'url': url_for(endpoint), 'icon': icon} for name, endpoint, icon in NAVIGATION
+        ]
+    return {'navigation': navigation, 'categories': CATEGORIES}
 
 # Password validation function
 def validate_password(password):
@@ -52,13 +79,13 @@ def validate_password(password):
         return False, "Password must contain at least one number"
     return True, "Password is valid"
 
-@app.route('/')
+@bp.route('/')
 def index():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
-    return redirect(url_for('login'))
+        return redirect(url_for('main.dashboard'))
+    return redirect(url_for('main.login'))
 
-@app.route('/signup', methods=['GET', 'POST'])
+@bp.route('/signup', methods=['GET', 'POST'])
 def signup():
     if request.method == 'POST':
         username = request.form['username']
@@ -69,27 +96,29 @@ def signup():
         is_valid, message = validate_password(password)
         if not is_valid:
             flash(message)
-            return redirect(url_for('signup'))
+            return redirect(url_for('main.signup'))
         
         if User.query.filter_by(username=username).first():
             flash('Username already exists')
-            return redirect(url_for('signup'))
+            return redirect(url_for('main.signup'))
         
         if User.query.filter_by(email=email).first():
             flash('Email already registered')
-            return redirect(url_for('signup'))
+            return redirect(url_for('main.signup'))
         
         user = User(username=username, email=email)
         user.set_password(password)
         db.session.add(user)
+        db.session.flush()
+        create_summary(user.id)
         db.session.commit()
         
         flash('Registration successful! Please login.')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     return render_template('signup.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
@@ -97,129 +126,73 @@ def login():
         user = User.query.filter_by(username=username).first()
         
         if user and user.check_password(password):
+            # Bring hashes made with older settings up to the configured method
+            if password_hasher.needs_rehash(user.password_hash):
+                user.set_password(password)
+                db.session.commit()
             login_user(user)
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         else:
             flash('Invalid username or password')
     
     return render_template('login.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('login'))
-
-# Function to check and move expired medicines
-def check_expired_medicines():
-    expired_meds = Medicine.query.filter(
-        Medicine.user_id == current_user.id,
-        Medicine.expiry_date < date.today(),
-        Medicine.quantity > 0
-    ).all()
-    
-    for medicine in expired_meds:
-        # Check if already in expired table
-        existing = ExpiredMedicine.query.filter_by(medicine_id=medicine.id).first()
-        if not existing:
-            expired_record = ExpiredMedicine(
-                medicine_id=medicine.id,
-                user_id=current_user.id,
-                name=medicine.name,
-                batch_number=medicine.batch_number,
-                category=medicine.category,
-                quantity=medicine.quantity,
-                price=medicine.price,
-                expiry_date=medicine.expiry_date,
-                original_value=medicine.quantity * medicine.price
-            )
-            db.session.add(expired_record)
-    
-    if expired_meds:
-        db.session.commit()
+    return redirect(url_for('main.login'))
 
-@app.route('/dashboard')
+# Medicines listed under each dashboard alert
+DASHBOARD_LIST_SIZE = 10
+
+@bp.route('/dashboard')
 @login_required
+@cached_page
 def dashboard():
-    # Check for expired medicines
-    check_expired_medicines()
-    
-    # Get alerts for expiring medicines (within 30 days)
-    expiry_threshold = date.today() + timedelta(days=30)
-    expiring_medicines = Medicine.query.filter(
-        Medicine.user_id == current_user.id,
-        Medicine.expiry_date <= expiry_threshold,
-        Medicine.expiry_date >= date.today()
-    ).all()
-    
-    # Get low stock alerts
-    low_stock_medicines = Medicine.query.filter(
-        Medicine.user_id == current_user.id,
-        Medicine.quantity <= Medicine.low_stock_alert
-    ).all()
-    
-    # Get total medicines count
-    total_medicines = Medicine.query.filter_by(user_id=current_user.id).count()
-    
-    # Get expired medicines count
-    expired_medicines = ExpiredMedicine.query.filter_by(user_id=current_user.id).count()
-    
-    # Get total stock value
-    total_stock_value = db.session.query(db.func.sum(Medicine.quantity * Medicine.price)).filter(
-        Medicine.user_id == current_user.id
-    ).scalar() or 0
+    # Alert counts come from SQL and only the first few medicines of each
+    # list are shown, with a link to the full list on the medicines page
+    today = date.today()
+    expiring = Medicine.query.filter(Medicine.user_id == current_user.id, alert_condition('expiring', today))
+    low_stock = Medicine.query.filter(Medicine.user_id == current_user.id, alert_condition('low_stock', today))
+    expiring_medicines = expiring.order_by(Medicine.expiry_date, Medicine.id).limit(DASHBOARD_LIST_SIZE).all()
+    low_stock_medicines = low_stock.order_by(Medicine.quantity, Medicine.id).limit(DASHBOARD_LIST_SIZE).all()
     
-    # Get today's sales
-    today_sales = db.session.query(db.func.sum(Sale.total_amount)).filter(
-        Sale.user_id == current_user.id,
-        db.func.date(Sale.sale_date) == date.today()
-    ).scalar() or 0
+    # Counts and totals come from the incrementally maintained summary row
+    summary = get_summary(current_user.id)
     
-    # Get expired stock value
-    expired_stock_value = db.session.query(db.func.sum(ExpiredMedicine.original_value)).filter(
-        ExpiredMedicine.user_id == current_user.id
-    ).scalar() or 0
+    # Get today's sales
+    today_sales = get_day_sales(current_user.id, date.today())
     
     return render_template('dashboard.html',
                          expiring_medicines=expiring_medicines,
                          low_stock_medicines=low_stock_medicines,
-                         total_medicines=total_medicines,
-                         expired_medicines=expired_medicines,
-                         total_stock_value=total_stock_value,
+                         expiring_count=expiring.count(),
+                         low_stock_count=low_stock.count(),
+                         total_medicines=summary.total_medicines,
+                         expired_medicines=summary.expired_medicines,
+                         total_stock_value=summary.total_stock_value,
                          today_sales=today_sales,
-                         expired_stock_value=expired_stock_value)
+                         expired_stock_value=summary.expired_stock_value)
 
-@app.route('/add_medicine', methods=['GET', 'POST'])
+@bp.route('/add_medicine', methods=['GET', 'POST'])
 @login_required
 def add_medicine():
     if request.method == 'POST':
-        name = request.form['name']
-        batch_number = request.form['batch_number']
-        category = request.form['category']
-        quantity = int(request.form['quantity'])
-        price = float(request.form['price'])
-        expiry_date = datetime.strptime(request.form['expiry_date'], '%Y-%m-%d').date()
-        low_stock_alert = int(request.form.get('low_stock_alert', 10))
+        # Shared with the bulk import so both apply the same rules
+        try:
+            values = validate_medicine(request.form)
+        except ValueError as error:
+            flash(str(error))
+            return redirect(url_for('main.add_medicine'))
         
-        # Check if expiry date is valid
-        if expiry_date <= date.today():
-            flash('Expiry date must be greater than current date')
-            return redirect(url_for('add_medicine'))
+        quantity = values['quantity']
+        price = values['price']
+        medicine = Medicine(user_id=current_user.id, **values)
         
-        medicine = Medicine(
-            name=name,
-            batch_number=batch_number,
-            category=category,
-            quantity=quantity,
-            price=price,
-            expiry_date=expiry_date,
-            low_stock_alert=low_stock_alert,
-            user_id=current_user.id
-        )
-        
-        # Add medicine first and commit to get the ID
+        # Add medicine first and flush to get the ID
         db.session.add(medicine)
-        db.session.commit()
+        db.session.flush()
         
         # Now add transaction record with the medicine ID
         transaction = Transaction(
@@ -230,49 +203,137 @@ def add_medicine():
             notes=f'Initial stock added'
         )
         db.session.add(transaction)
+        adjust_summary(current_user.id, total_medicines=1, total_stock_value=quantity * price)
+        touch_inventory(current_user.id)
         db.session.commit()
         
         flash('Medicine added successfully!')
-        return redirect(url_for('medicines'))
+        return redirect(url_for('main.medicines'))
     
     return render_template('add_medicine.html')
 
-@app.route('/medicines')
+@bp.route('/import_medicines', methods=['GET', 'POST'])
 @login_required
-def medicines():
-    from datetime import date, timedelta
+def import_medicines_page():
+    report = None
+    if request.method == 'POST':
+        report = _import_upload()
+        if report is None:
+            flash('Please upload a .csv or .json file')
+            return redirect(url_for('main.import_medicines_page'))
     
-    search = request.args.get('search', '')
-    category_filter = request.args.get('category', '')
+    return render_template('import_medicines.html', report=report)
+
+@bp.route('/api/medicines/import', methods=['POST'])
+@login_required
+def api_import_medicines():
+    report = _import_upload()
+    if report is None:
+        return jsonify({'error': 'Upload a CSV or JSON file in the "file" field'}), 400
+    return jsonify(report)
+
+# Import the uploaded file for the current user, None if there is no usable upload
+def _import_upload():
+    upload = request.files.get('file')
+    file_format = request.form.get('format') or detect_format(upload.filename if upload else None)
+    if not upload or file_format not in ('csv', 'json'):
+        return None
+    return import_medicines(current_user.id, iter_import_rows(upload.stream, file_format))
+
+# Sortable columns of the medicine list, ties broken by id
+MEDICINE_SORTS = {
+    'name': Medicine.name,
+    'category': Medicine.category,
+    'quantity': Medicine.quantity,
+    'price': Medicine.price,
+    'expiry_date': Medicine.expiry_date,
+    'created_at': Medicine.created_at,
+}
+
+# Medicines raising each dashboard alert, as a condition on the medicine table
+def alert_condition(alert, today):
+    if alert == 'expiring':
+        return db.and_(Medicine.expiry_date >= today,
+                       Medicine.expiry_date <= today + timedelta(days=EXPIRY_WINDOW_DAYS))
+    if alert == 'low_stock':
+        return Medicine.quantity <= Medicine.low_stock_alert
+    return None
+
+# One page of the filtered medicine list plus SQL totals over the whole filter
+def _medicine_page(args):
+    search = args.get('search', '')
+    category_filter = args.get('category', '')
+    alert_filter = args.get('alert') if args.get('alert') in ('expiring', 'low_stock') else ''
+    sort = args.get('sort') if args.get('sort') in MEDICINE_SORTS else 'name'
+    order = 'desc' if args.get('order') == 'desc' else 'asc'
+    per_page = parse_per_page(args.get('per_page'))
     
-    # Build query with filters
     query = Medicine.query.filter(Medicine.user_id == current_user.id)
-    
     if search:
-        query = query.filter(Medicine.name.ilike(f'%{search}%'))
-    
+        query = filter_by_search(query, search, current_user.id)
     if category_filter:
         query = query.filter(Medicine.category == category_filter)
+    if alert_filter:
+        query = query.filter(alert_condition(alert_filter, date.today()))
+    
+    total_medicines, total_items, total_stock_value, category_count = query.with_entities(
+        db.func.count(Medicine.id),
+        db.func.coalesce(db.func.sum(Medicine.quantity), 0),
+        db.func.coalesce(db.func.sum(Medicine.quantity * Medicine.price), 0),
+        db.func.count(db.distinct(Medicine.category))
+    ).one()
+    
+    pages = max((total_medicines + per_page - 1) // per_page, 1)
+    page = min(max(args.get('page', 1, type=int), 1), pages)
+    column = MEDICINE_SORTS[sort]
+    if order == 'desc':
+        query = query.order_by(column.desc(), Medicine.id.desc())
+    else:
+        query = query.order_by(column, Medicine.id)
+    medicines_list = query.offset((page - 1) * per_page).limit(per_page).all()
     
-    medicines_list = query.all()
-    
-    # Calculate expiry threshold (30 days from now)
-    expiry_threshold = date.today() + timedelta(days=30)
-    
-    # Calculate total stock value
-    total_stock_value = sum(med.quantity * med.price for med in medicines_list)
-    total_items = sum(med.quantity for med in medicines_list)
-    
-    return render_template('medicines.html', 
-                         medicines=medicines_list, 
-                         search=search,
-                         category_filter=category_filter,
-                         current_date=date.today(),
-                         expiry_threshold=expiry_threshold,
-                         total_stock_value=total_stock_value,
-                         total_items=total_items)
+    return {
+        'medicines': medicines_list,
+        'search': search,
+        'category_filter': category_filter,
+        'alert_filter': alert_filter,
+        'sort': sort,
+        'order': order,
+        'page': page,
+        'pages': pages,
+        'per_page': per_page,
+        # Non-empty list arguments to carry over into sort and page links
+        'list_args': {key: args[key] for key in ('search', 'category', 'alert', 'sort', 'order', 'per_page') if args.get(key)},
+        'totals': {
+            'total_medicines': total_medicines,
+            'total_items': total_items,
+            'total_stock_value': round(total_stock_value, 2),
+            'categories': category_count,
+        },
+        'current_date': date.today(),
+        'expiry_threshold': date.today() + timedelta(days=30),
+    }
+
+@bp.route('/medicines')
+@login_required
+@cached_page
+def medicines():
+    return render_template('medicines.html', **_medicine_page(request.args))
+
+# Table rows and pager for the medicine list, so paging and sorting don't reload the page
+@bp.route('/medicines/table')
+@login_required
+@cached_page
+def medicines_table():
+    page = _medicine_page(request.args)
+    return jsonify({
+        'html': render_template('medicine_table.html', **page),
+        'totals': page['totals'],
+        'page': page['page'],
+        'pages': page['pages'],
+    })
 
-@app.route('/edit_medicine/<int:medicine_id>', methods=['GET', 'POST'])
+@bp.route('/edit_medicine/<int:medicine_id>', methods=['GET', 'POST'])
 @login_required
 def edit_medicine(medicine_id):
     medicine = Medicine.query.get_or_404(medicine_id)
@@ -280,9 +341,11 @@ def edit_medicine(medicine_id):
     # Check if medicine belongs to current user
     if medicine.user_id != current_user.id:
         flash('Access denied')
-        return redirect(url_for('medicines'))
+        return redirect(url_for('main.medicines'))
     
     if request.method == 'POST':
+        old_price = medicine.price
+        old_alerts = alert_kinds(medicine)
         medicine.name = request.form['name']
         medicine.batch_number = request.form['batch_number']
         medicine.category = request.form['category']
@@ -292,17 +355,20 @@ def edit_medicine(medicine_id):
         new_expiry_date = datetime.strptime(request.form['expiry_date'], '%Y-%m-%d').date()
         if new_expiry_date <= date.today():
             flash('Expiry date must be greater than current date')
-            return redirect(url_for('edit_medicine', medicine_id=medicine_id))
+            return redirect(url_for('main.edit_medicine', medicine_id=medicine_id))
         
         medicine.expiry_date = new_expiry_date
         
+        adjust_summary(current_user.id, total_stock_value=medicine.quantity * (medicine.price - old_price))
+        touch_inventory(current_user.id)
         db.session.commit()
+        publish_new_alerts(medicine, old_alerts)
         flash('Medicine updated successfully!')
-        return redirect(url_for('medicines'))
+        return redirect(url_for('main.medicines'))
     
     return render_template('edit_medicine.html', medicine=medicine)
 
-@app.route('/delete_medicine/<int:medicine_id>')
+@bp.route('/delete_medicine/<int:medicine_id>')
 @login_required
 def delete_medicine(medicine_id):
     medicine = Medicine.query.get_or_404(medicine_id)
@@ -310,19 +376,15 @@ def delete_medicine(medicine_id):
     # Check if medicine belongs to current user
     if medicine.user_id != current_user.id:
         flash('Access denied')
-        return redirect(url_for('medicines'))
+        return redirect(url_for('main.medicines'))
     
-    # Delete related transactions and sales first
-    Transaction.query.filter_by(medicine_id=medicine_id).delete()
-    Sale.query.filter_by(medicine_id=medicine_id).delete()
-    ExpiredMedicine.query.filter_by(medicine_id=medicine_id).delete()
-    db.session.delete(medicine)
-    db.session.commit()
+    # Its ledger, sales, expired record and rollups are removed by ON DELETE CASCADE
+    delete_medicines(current_user.id, Medicine.id == medicine_id)
     
     flash('Medicine deleted successfully!')
-    return redirect(url_for('medicines'))
+    return redirect(url_for('main.medicines'))
 
-@app.route('/update_stock/<int:medicine_id>', methods=['POST'])
+@bp.route('/update_stock/<int:medicine_id>', methods=['POST'])
 @login_required
 def update_stock(medicine_id):
     medicine = Medicine.query.get_or_404(medicine_id)
@@ -335,16 +397,20 @@ def update_stock(medicine_id):
     notes = request.form.get('notes', '')
     
     if action == 'add':
-        medicine.quantity += quantity
         transaction_type = 'in'
+        stock_delta = quantity
     elif action == 'sell':
-        if medicine.quantity < quantity:
-            return jsonify({'error': 'Insufficient stock'}), 400
-        medicine.quantity -= quantity
         transaction_type = 'out'
+        stock_delta = -quantity
     else:
         return jsonify({'error': 'Invalid action'}), 400
     
+    # Applied in the database so concurrent updates can't oversell
+    old_alerts = alert_kinds(medicine)
+    new_quantity = change_stock(medicine.id, stock_delta)
+    if new_quantity is None:
+        return jsonify({'error': 'Insufficient stock'}), 400
+    
     # Add transaction record
     transaction = Transaction(
         medicine_id=medicine.id,
@@ -354,18 +420,21 @@ def update_stock(medicine_id):
         notes=notes
     )
     db.session.add(transaction)
+    adjust_summary(current_user.id, total_stock_value=stock_delta * medicine.price)
+    touch_inventory(current_user.id)
     db.session.commit()
+    publish_new_alerts(medicine, old_alerts)
     
-    return jsonify({'success': True, 'new_quantity': medicine.quantity})
+    return jsonify({'success': True, 'new_quantity': new_quantity})
 
-@app.route('/sell_medicine/<int:medicine_id>', methods=['GET', 'POST'])
+@bp.route('/sell_medicine/<int:medicine_id>', methods=['GET', 'POST'])
 @login_required
 def sell_medicine(medicine_id):
     medicine = Medicine.query.get_or_404(medicine_id)
     
     if medicine.user_id != current_user.id:
         flash('Access denied')
-        return redirect(url_for('medicines'))
+        return redirect(url_for('main.medicines'))
     
     if request.method == 'POST':
         quantity = int(request.form['quantity'])
@@ -375,80 +444,131 @@ def sell_medicine(medicine_id):
         
         if quantity <= 0:
             flash('Quantity must be greater than 0')
-            return redirect(url_for('sell_medicine', medicine_id=medicine_id))
-        
-        if medicine.quantity < quantity:
-            flash(f'Insufficient stock. Available: {medicine.quantity}')
-            return redirect(url_for('sell_medicine', medicine_id=medicine_id))
+            return redirect(url_for('main.sell_medicine', medicine_id=medicine_id))
         
-        total_amount = quantity * sale_price
-        
-        # Create sale record
-        sale = Sale(
-            medicine_id=medicine.id,
-            user_id=current_user.id,
-            quantity=quantity,
-            sale_price=sale_price,
-            total_amount=total_amount,
-            customer_name=customer_name,
-            notes=notes
-        )
-        
-        # Update medicine quantity
-        medicine.quantity -= quantity
-        
-        # Add transaction record
-        transaction = Transaction(
-            medicine_id=medicine.id,
-            user_id=current_user.id,
-            transaction_type='out',
-            quantity=quantity,
-            notes=f'Sold to {customer_name}. {notes}'
-        )
-        
-        db.session.add(sale)
-        db.session.add(transaction)
-        db.session.commit()
+        # A one-line checkout: stock, sale and ledger rows are written together
+        try:
+            total_amount = checkout(current_user.id, [(medicine.id, quantity, sale_price)], customer_name, notes)
+        except ValueError as error:
+            flash(str(error))
+            return redirect(url_for('main.sell_medicine', medicine_id=medicine_id))
         
         flash(f'Medicine sold successfully! Total amount: ₹{total_amount:.2f}')
-        return redirect(url_for('medicines'))
+        return redirect(url_for('main.medicines'))
     
     return render_template('sell_medicine.html', medicine=medicine)
 
-@app.route('/sales')
+@bp.route('/api/checkout', methods=['POST'])
+@login_required
+def api_checkout():
+    data = request.get_json(silent=True) or {}
+    try:
+        lines = parse_lines(data.get('items'))
+        total_amount = checkout(current_user.id, lines,
+                                data.get('customer_name', ''), data.get('notes', ''))
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    
+    return jsonify({'success': True, 'items': len(lines), 'total_amount': total_amount})
+
+# Batch edits of many medicines, picked by `ids` and/or a `filter` object
+@bp.route('/api/medicines/bulk_update', methods=['POST'])
+@login_required
+def api_bulk_update():
+    data = request.get_json(silent=True) or {}
+    try:
+        updated = bulk_update(current_user.id, parse_selection(data, current_user.id), parse_changes(data))
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    
+    return jsonify({'success': True, 'updated': updated})
+
+@bp.route('/api/medicines/bulk_delete', methods=['POST'])
+@login_required
+def api_bulk_delete():
+    data = request.get_json(silent=True) or {}
+    try:
+        deleted = delete_medicines(current_user.id, parse_selection(data, current_user.id))
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    
+    return jsonify({'success': True, 'deleted': deleted})
+
+# Without ids or a filter every expired medicine is disposed of
+@bp.route('/api/medicines/dispose_expired', methods=['POST'])
 @login_required
+def api_dispose_expired():
+    data = request.get_json(silent=True) or {}
+    try:
+        disposed, value = dispose_expired(current_user.id, parse_selection(data, current_user.id, required=False))
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    
+    return jsonify({'success': True, 'disposed': disposed, 'value': value})
+
+@bp.route('/sales')
+@login_required
+@cached_page
 def sales():
-    sales_list = Sale.query.join(Medicine).filter(
-        Medicine.user_id == current_user.id
-    ).order_by(Sale.sale_date.desc()).all()
+    filters = history_filters(request.args)
     
-    # Calculate total sales
-    total_sales = db.session.query(db.func.sum(Sale.total_amount)).filter(
-        Sale.user_id == current_user.id
-    ).scalar() or 0
+    # Pages continue into the archived sales once the recent ones run out
+    sales_list, next_cursor = keyset_page(
+        _history_query(Sale, 'sale_date', filters), Sale.sale_date, Sale.id,
+        filters['cursor'], filters['per_page'],
+        archive=(_history_query(ArchivedSale, 'sale_date', filters), ArchivedSale.sale_date, ArchivedSale.id)
+    )
     
-    # Calculate today's sales
-    today_sales = db.session.query(db.func.sum(Sale.total_amount)).filter(
-        Sale.user_id == current_user.id,
-        db.func.date(Sale.sale_date) == date.today()
-    ).scalar() or 0
+    # Totals come from the daily sales rollup
+    total_sales = get_total_sales(current_user.id)
+    today_sales = get_day_sales(current_user.id, date.today())
     
     return render_template('sales.html', 
                          sales=sales_list, 
                          total_sales=total_sales,
-                         today_sales=today_sales)
+                         today_sales=today_sales,
+                         filters=filters,
+                         filter_medicine=_filter_medicine(filters['medicine_id']),
+                         next_cursor=next_cursor)
 
-@app.route('/transactions')
+@bp.route('/transactions')
 @login_required
+@cached_page
 def transactions():
-    transactions_list = Transaction.query.join(Medicine).filter(
-        Medicine.user_id == current_user.id
-    ).order_by(Transaction.transaction_date.desc()).all()
+    filters = history_filters(request.args)
     
-    return render_template('transactions.html', transactions=transactions_list)
+    transactions_list, next_cursor = keyset_page(
+        _history_query(Transaction, 'transaction_date', filters), Transaction.transaction_date, Transaction.id,
+        filters['cursor'], filters['per_page'],
+        archive=(_history_query(ArchivedTransaction, 'transaction_date', filters),
+                 ArchivedTransaction.transaction_date, ArchivedTransaction.id)
+    )
+    
+    return render_template('transactions.html',
+                         transactions=transactions_list,
+                         filters=filters,
+                         filter_medicine=_filter_medicine(filters['medicine_id']),
+                         next_cursor=next_cursor)
 
-@app.route('/expired_medicines')
+# Filtered history rows of a ledger or its archive. Medicine is loaded in the
+# same query so the template doesn't lazy load per row.
+def _history_query(model, date_column, filters):
+    query = model.query.join(model.medicine).options(db.contains_eager(model.medicine)).filter(
+        model.user_id == current_user.id
+    )
+    if filters['medicine_id']:
+        query = query.filter(model.medicine_id == filters['medicine_id'])
+    return apply_date_range(query, getattr(model, date_column), filters['start'], filters['end'])
+
+# Medicine shown in the "filtered by" badge of the history views
+def _filter_medicine(medicine_id):
+    if not medicine_id:
+        return None
+    return Medicine.query.filter_by(id=medicine_id, user_id=current_user.id).first()
+
+@bp.route('/expired_medicines')
 @login_required
+@cached_page
 def expired_medicines():
     expired_list = ExpiredMedicine.query.filter_by(user_id=current_user.id).order_by(ExpiredMedicine.expired_at.desc()).all()
     
@@ -460,13 +580,77 @@ def expired_medicines():
                          total_expired_value=total_expired_value,
                          total_expired_items=total_expired_items)
 
-@app.route('/api/medicines')
+# Stream a whole ledger as CSV or XLSX; CSV is gzipped when the client accepts it
+@bp.route('/export/<kind>')
+@login_required
+def export_ledger(kind):
+    file_format = request.args.get('format', 'csv')
+    if kind not in EXPORTS or file_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Unknown export'}), 404
+    
+    header, statements = export_statements(kind, current_user.id,
+                                           parse_date(request.args.get('start')),
+                                           parse_date(request.args.get('end')),
+                                           request.args.get('medicine_id', type=int))
+    chunks = generate_export(file_format, header, statements, kind.title())
+    response_headers = {'Content-Disposition': f'attachment; filename={kind}-{date.today()}.{file_format}'}
+    if file_format == 'csv':
+        response_headers['Vary'] = 'Accept-Encoding'
+        if 'gzip' in request.accept_encodings:
+            chunks = gzip_chunks(chunks)
+            response_headers['Content-Encoding'] = 'gzip'
+    
+    mimetype = ('text/csv' if file_format == 'csv'
+                else 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=response_headers)
+
+@bp.route('/api/medicines')
 @login_required
+@cached_page
 def api_medicines():
-    medicines = Medicine.query.filter_by(user_id=current_user.id).all()
-    result = []
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    
+    # Validators change with every medicine write and when the day rolls over
+    today = date.today()
+    summary = get_summary(current_user.id)
+    etag = hashlib.sha1(
+        f'{current_user.id}:{summary.inventory_version}:{today}:{",".join(fields)}:{since}'.encode()
+    ).hexdigest()
+    last_modified = max(summary.inventory_updated_at, datetime.combine(today, datetime.min.time()))
+    last_modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+    
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = request.if_modified_since is not None and last_modified <= request.if_modified_since
     
-    for med in medicines:
+    if not_modified:
+        response = Response(status=304)
+    else:
+        statement = feed_statement(current_user.id, fields, since)
+        response = Response(stream_with_context(generate_feed(statement, fields, today)),
+                            mimetype='application/json')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@bp.route('/api/medicines/search')
+@login_required
+@cached_page
+def api_search_medicines():
+    search = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    if not search:
+        return jsonify([])
+    
+    result = []
+    for med in search_medicines(current_user.id, search, limit):
         result.append({
             'id': med.id,
             'name': med.name,
@@ -474,27 +658,243 @@ def api_medicines():
             'category': med.category,
             'quantity': med.quantity,
             'price': med.price,
-            'expiry_date': med.expiry_date.isoformat(),
-            'low_stock_alert': med.low_stock_alert,
-            'is_expired': med.expiry_date < date.today(),
-            'is_low_stock': med.quantity <= med.low_stock_alert,
-            'is_expiring_soon': med.expiry_date <= (date.today() + timedelta(days=30))
+            'expiry_date': med.expiry_date.isoformat()
         })
     
     return jsonify(result)
 
-# Jinja2 filter for unique values
-@app.template_filter('unique')
-def unique_filter(sequence):
-    seen = set()
-    result = []
-    for item in sequence:
-        if item not in seen:
-            seen.add(item)
-            result.append(item)
-    return result
+@bp.route('/api/reports/sales')
+@login_required
+@cached_page
+def api_sales_report():
+    today = date.today()
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else today - timedelta(days=29)
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else today
+        top = min(max(request.args.get('top', 5, type=int), 0), MAX_TOP)
+        report = sales_report(current_user.id, start, end, request.args.get('interval', 'day'), top)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    
+    return jsonify(report)
+
+# Stock on hand at a past moment, from the nearest snapshot and the ledger since
+@bp.route('/api/inventory/as_of')
+@login_required
+@cached_page
+def api_inventory_as_of():
+    try:
+        at = parse_as_of(request.args['at']) if request.args.get('at') else datetime.utcnow()
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    
+    return jsonify(stock_as_of(current_user.id, at))
+
+# Medicines whose quantity does not match their transactions
+@bp.route('/api/inventory/reconcile')
+@login_required
+def api_inventory_reconcile():
+    return jsonify(reconcile_stock(current_user.id, full=request.args.get('full') == '1'))
+
+# Low stock and expiry alerts pushed as they happen, one long-lived connection per tab
+@bp.route('/api/alerts/stream')
+@login_required
+def api_alert_stream():
+    alerts = stream_alerts(current_user.id, current_app.config['ALERT_KEEPALIVE'],
+                           current_app.config['ALERT_POLL_SECONDS'],
+                           request.headers.get('Last-Event-ID', type=int))
+    response = Response(stream_with_context(alerts), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/api/cache_stats')
+@login_required
+def api_cache_stats():
+    return jsonify({'user_cache': user_cache.stats(), 'page_cache': page_cache.stats()})
+
+# Recompute the dashboard summary tables from the base tables
+@bp.cli.command('rebuild-summary')
+@click.option('--check', is_flag=True, help='Only report mismatches, do not rewrite the summary.')
+def rebuild_summary_command(check):
+    mismatches = 0
+    for user in User.query.all():
+        if check:
+            for field, stored, expected in check_summary(user.id):
+                mismatches += 1
+                click.echo(f'{user.username}: {field} stored={stored} expected={expected}')
+        else:
+            rebuild_summary(user.id)
+    if check:
+        click.echo(f'{mismatches} mismatches found')
+        if mismatches:
+            raise SystemExit(1)
+    else:
+        db.session.commit()
+        click.echo('Dashboard summary rebuilt')
+
+# Move expired medicines into the expired table, normally run once per day
+@bp.cli.command('sweep-expired')
+@click.option('--full', is_flag=True, help='Ignore the watermark and look at every expired medicine.')
+def sweep_expired_command(full):
+    sweep = sweep_expired_medicines(full=full)
+    click.echo(f'Moved {sweep.moved_count} expired medicines in {sweep.duration_ms:.1f} ms')
+
+# Move old transactions and sales into the archive tables
+@bp.cli.command('archive-ledger')
+@click.option('--days', type=int, help='Archive rows older than this many days (defaults to LEDGER_ARCHIVE_DAYS).')
+@click.option('--batch-size', type=int, help='Rows moved per transaction (defaults to LEDGER_ARCHIVE_BATCH_SIZE).')
+@click.option('--pause', type=float, default=0, help='Seconds to wait between batches so other writers get in.')
+def archive_ledger_command(days, batch_size, pause):
+    run = archive_ledger(days or current_app.config['LEDGER_ARCHIVE_DAYS'],
+                         batch_size or current_app.config['LEDGER_ARCHIVE_BATCH_SIZE'], pause)
+    click.echo(f'Archived {run.moved_transactions} transactions and {run.moved_sales} sales '
+               f'older than {run.cutoff:%Y-%m-%d} in {run.duration_ms:.1f} ms')
+
+# Record every medicine's quantity, normally run once per day by the scheduler
+@bp.cli.command('snapshot-stock')
+@click.option('--at', help='UTC time the snapshot is taken as of (defaults to the start of today).')
+def snapshot_stock_command(at):
+    try:
+        at = parse_as_of(at) if at else None
+    except ValueError:
+        raise click.ClickException('--at must look like YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS')
+    run = take_stock_snapshot(at, current_app.config['STOCK_SNAPSHOT_KEEP_DAYS'])
+    if run is None:
+        click.echo('A snapshot for that time already exists')
+    else:
+        click.echo(f'Snapshot of {run.medicines} medicines as of {run.taken_at} in {run.duration_ms:.1f} ms')
+
+# Compare stored medicine quantities with the transaction ledger
+@bp.cli.command('reconcile-stock')
+@click.option('--username', help='Only check this user.')
+@click.option('--full', is_flag=True, help='Replay the whole ledger instead of starting from the latest snapshot.')
+def reconcile_stock_command(username, full):
+    users = User.query.filter_by(username=username).all() if username else User.query.all()
+    if username and not users:
+        raise click.ClickException(f'No user named {username}')
+    drifted = 0
+    for user in users:
+        for row in reconcile_stock(user.id, full)['drift']:
+            drifted += 1
+            click.echo(f'{user.username}: {row["name"]} ({row["batch_number"]}) '
+                       f'quantity={row["quantity"]} ledger={row["ledger_quantity"]}')
+    click.echo(f'{drifted} medicines drifted from the ledger')
+    if drifted:
+        raise SystemExit(1)
+
+# Create missing tables and indexes on an existing database
+@bp.cli.command('upgrade-db')
+def upgrade_db_command():
+    applied = upgrade_database()
+    click.echo(f'Applied: {", ".join(applied)}' if applied else 'Database is up to date')
+
+# Bulk load medicines for a user from a CSV or JSON file
+@bp.cli.command('import-medicines')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--username', required=True, help='User that will own the imported medicines.')
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'json']), help='Defaults to the file extension.')
+def import_medicines_command(path, username, file_format):
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'No user named {username}')
+    file_format = file_format or detect_format(path)
+    if file_format is None:
+        raise click.ClickException('Cannot tell the file format, pass --format')
+    
+    with open(path, 'rb') as stream:
+        report = import_medicines(user.id, iter_import_rows(stream, file_format))
+    
+    for error in report['errors']:
+        click.echo(f'Row {error["row"]}: {error["error"]}' if error['row'] else error['error'])
+    click.echo(f'Imported {report["imported"]} medicines, {report["failed"]} rows failed '
+               f'({report["rows_per_second"]} rows/sec)')
+
+# Write a user's sales, transactions or expired medicines to a file
+@bp.cli.command('export-ledger')
+@click.argument('kind', type=click.Choice(list(EXPORTS)))
+@click.argument('output', type=click.File('wb'))
+@click.option('--username', required=True, help='User whose rows are exported.')
+@click.option('--start', help='First day to include (YYYY-MM-DD).')
+@click.option('--end', help='Last day to include (YYYY-MM-DD).')
+@click.option('--format', 'file_format', type=click.Choice(EXPORT_FORMATS), default='csv')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+def export_ledger_command(kind, output, username, start, end, file_format, compress):
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'No user named {username}')
+    
+    start_date, end_date = parse_date(start), parse_date(end)
+    if (start and start_date is None) or (end and end_date is None):
+        raise click.ClickException('Dates must look like YYYY-MM-DD')
+    
+    header, statements = export_statements(kind, user.id, start_date, end_date)
+    chunks = generate_export(file_format, header, statements, kind.title())
+    for chunk in gzip_chunks(chunks) if compress else chunks:
+        output.write(chunk)
+
+# Refill the medicine full-text index from the medicine table
+@bp.cli.command('rebuild-search')
+def rebuild_search_command():
+    rebuild_search_index()
+    click.echo('Search index rebuilt')
+
+# Fail if any hot route's queries fall back to a full table scan
+@bp.cli.command('check-query-plans')
+@click.option('--username', help='User to request the routes as (defaults to the first user).')
+def check_query_plans_command(username):
+    user = User.query.filter_by(username=username).first() if username else User.query.first()
+    if user is None:
+        raise click.ClickException('No user to run the routes as')
+    problems = find_full_scans(current_app._get_current_object(), user)
+    for route, statement, detail in problems:
+        click.echo(f'{route}: {detail}\n    {" ".join(statement.split())}')
+    click.echo(f'{len(problems)} full table scans found')
+    if problems:
+        raise SystemExit(1)
+
+# Run the daily expiry sweep, alerts and stock snapshot in the foreground,
+# for deployments where the web workers don't run the scheduler
+@bp.cli.command('run-scheduler')
+def run_scheduler_command():
+    click.echo('Running the daily scheduler, press Ctrl+C to stop')
+    start_expiry_scheduler(current_app._get_current_object()).wait()
+
+# Compile every template up front so a worker's first request doesn't pay for
+# it; with a preloading server the workers share the compiled templates
+def warm_templates(app):
+    for name in app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html')):
+        app.jinja_env.get_template(name)
+
+# Build the application; config is a mapping or object overriding config.Config
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if isinstance(config, dict):
+        app.config.from_mapping(config)
+    elif config is not None:
+        app.config.from_object(config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    
+    db.init_app(app)
+    with app.app_context():
+        configure_engine(db.engine, app.config)
+    
+    login_manager.init_app(app)
+    user_cache.configure(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+    password_hasher.configure(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_WORKERS'])
+    page_cache.configure(app.config)
+    metrics.init_app(app)
+    metrics.add_collector(user_cache.metric_lines)
+    metrics.add_collector(page_cache.metric_lines)
+    app.register_blueprint(bp)
+    return app
 
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
-        db.create_all()
+        upgrade_database()
+    # Only start the scheduler in the serving process, not the reloader parent
+    if app.config['EXPIRY_SWEEP_SCHEDULER'] and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_expiry_scheduler(app)
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,203 @@
+"""Seeded synthetic pharmacy data for benchmarks.
+
+    python -m benchmarks.generate --db /tmp/bench.db --users 10 --medicines 50000 --ledger 2000000
+
+The same seed and sizes always give the same rows. Medicines, transactions
+and sales are bulk inserted in chunks, and every medicine's quantity agrees
+with its ledger, so reconcile-stock finds no drift. The dashboard summary
+and the expired medicine table are then rebuilt the way the app does it,
+and stock snapshots are taken every 30 days of the ledger.
+"""
+from datetime import date, datetime, timedelta
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from database import db  # noqa: E402
+from expiry import sweep_expired_medicines  # noqa: E402
+from migrations import upgrade_database  # noqa: E402
+from models import User, Medicine, Transaction, Sale  # noqa: E402
+from stock_snapshots import take_stock_snapshot  # noqa: E402
+from summary import rebuild_summary  # noqa: E402
+
+CHUNK_SIZE = 10000
+PASSWORD = 'bench1234'
+
+CATEGORIES = ['tablet', 'syrup', 'capsule', 'ointment', 'injection', 'drops', 'inhaler', 'cream', 'gel', 'powder']
+STEMS = ['Paracetamol', 'Ibuprofen', 'Amoxicillin', 'Cetirizine', 'Metformin', 'Omeprazole', 'Azithromycin',
+         'Atorvastatin', 'Amlodipine', 'Losartan', 'Salbutamol', 'Pantoprazole', 'Diclofenac', 'Ciprofloxacin',
+         'Montelukast', 'Levothyroxine', 'Ranitidine', 'Doxycycline', 'Clopidogrel', 'Prednisolone']
+STRENGTHS = ['5mg', '10mg', '25mg', '50mg', '100mg', '250mg', '500mg', '650mg', '1g']
+
+def _insert_chunks(model, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            db.session.execute(db.insert(model), chunk)
+            db.session.commit()
+            chunk = []
+    if chunk:
+        db.session.execute(db.insert(model), chunk)
+        db.session.commit()
+
+# Fill the current app's database. `ledger` rows are split 60/40 between
+# transactions and sales and spread over the last `days` days; each sale's
+# 'out' transaction counts towards the 60%, the rest are stock adjustments.
+# On top of those every medicine gets an opening 'in' transaction, and its
+# quantity is what its ledger adds up to.
+def generate(seed=42, users=2, medicines=2000, ledger=50000, days=365):
+    rng = random.Random(seed)
+    upgrade_database()
+    today = date.today()
+    now = datetime.utcnow()
+    created = datetime.combine(today - timedelta(days=days), datetime.min.time())
+
+    user_ids = []
+    for number in range(users):
+        user = User(username=f'bench{number}', email=f'bench{number}@example.com', created_at=created)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.flush()
+        user_ids.append(user.id)
+    db.session.commit()
+
+    # Roughly 5% already expired and 10% expiring within 30 days
+    def expiry_offset():
+        roll = rng.random()
+        if roll < 0.05:
+            return rng.randint(-200, -1)
+        if roll < 0.15:
+            return rng.randint(1, 30)
+        return rng.randint(31, 900)
+
+    # Quantities are set from the ledger once it is generated
+    for user_id in user_ids:
+        _insert_chunks(Medicine, ({
+            'name': f'{rng.choice(STEMS)} {rng.choice(STRENGTHS)}',
+            'batch_number': f'B{rng.randrange(10 ** 8):08d}',
+            'category': rng.choice(CATEGORIES),
+            'quantity': 0,
+            'price': round(rng.uniform(1, 500), 2),
+            'expiry_date': today + timedelta(days=expiry_offset()),
+            'low_stock_alert': rng.choice((5, 10, 20)),
+            'created_at': created,
+            'updated_at': created,
+            'user_id': user_id,
+        } for _ in range(medicines)))
+
+    medicines_by_user = {
+        user_id: [(medicine_id, price) for medicine_id, price in db.session.query(Medicine.id, Medicine.price)
+                  .filter(Medicine.user_id == user_id).order_by(Medicine.id)]
+        for user_id in user_ids
+    }
+    seconds = days * 24 * 3600
+    stock_in = {}
+    stock_out = {}
+
+    def ledger_moment():
+        return now - timedelta(seconds=rng.randrange(seconds))
+
+    def movement(user_id, medicine_id, transaction_type, quantity, moment, notes):
+        totals = stock_in if transaction_type == 'in' else stock_out
+        totals[medicine_id] = totals.get(medicine_id, 0) + quantity
+        return {
+            'medicine_id': medicine_id,
+            'user_id': user_id,
+            'transaction_type': transaction_type,
+            'quantity': quantity,
+            'transaction_date': moment,
+            'notes': notes,
+        }
+
+    # Every sale books an 'out' transaction at the same moment, like checkout
+    sales = ledger - int(ledger * 0.6)
+    for start in range(0, sales, CHUNK_SIZE):
+        sale_rows, transaction_rows = [], []
+        for index in range(start, min(start + CHUNK_SIZE, sales)):
+            user_id = user_ids[index % users]
+            medicine_id, price = rng.choice(medicines_by_user[user_id])
+            quantity = rng.randint(1, 10)
+            moment = ledger_moment()
+            sale_rows.append({
+                'medicine_id': medicine_id,
+                'user_id': user_id,
+                'quantity': quantity,
+                'sale_price': price,
+                'total_amount': quantity * price,
+                'customer_name': f'Customer {rng.randrange(1000)}',
+                'sale_date': moment,
+                'notes': '',
+            })
+            transaction_rows.append(movement(user_id, medicine_id, 'out', quantity, moment, 'Sale'))
+        db.session.execute(db.insert(Sale), sale_rows)
+        db.session.execute(db.insert(Transaction), transaction_rows)
+        db.session.commit()
+
+    # The rest of the transaction share are stock adjustments
+    adjustments = max(int(ledger * 0.6) - sales, 0)
+    _insert_chunks(Transaction, (
+        movement(user_id, rng.choice(medicines_by_user[user_id])[0], rng.choice(('in', 'out')),
+                 rng.randint(1, 50), ledger_moment(), 'Generated')
+        for user_id in (user_ids[index % users] for index in range(adjustments))
+    ))
+
+    # Each medicine opens with enough stock to cover everything that goes
+    # out later, so its running quantity never drops below zero, and its
+    # stored quantity is what the ledger adds up to
+    opening = {
+        medicine_id: stock_out.get(medicine_id, 0) + rng.randint(0, 500)
+        for user_id in user_ids for medicine_id, _ in medicines_by_user[user_id]
+    }
+    _insert_chunks(Transaction, ({
+        'medicine_id': medicine_id,
+        'user_id': user_id,
+        'transaction_type': 'in',
+        'quantity': opening[medicine_id],
+        'transaction_date': created,
+        'notes': 'Initial stock added',
+    } for user_id in user_ids for medicine_id, _ in medicines_by_user[user_id]))
+    quantities = [
+        {'id': medicine_id, 'updated_at': created,
+         'quantity': quantity + stock_in.get(medicine_id, 0) - stock_out.get(medicine_id, 0)}
+        for medicine_id, quantity in opening.items()
+    ]
+    for start in range(0, len(quantities), CHUNK_SIZE):
+        db.session.execute(db.update(Medicine), quantities[start:start + CHUNK_SIZE])
+        db.session.commit()
+
+    for user_id in user_ids:
+        rebuild_summary(user_id)
+    db.session.commit()
+    sweep_expired_medicines(full=True)
+    for back in range(days, -1, -30):
+        take_stock_snapshot(datetime.combine(today - timedelta(days=back), datetime.min.time()))
+    return user_ids
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic pharmacy data')
+    parser.add_argument('--db', required=True, help='SQLite file to create')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--medicines', type=int, default=2000, help='Medicines per user')
+    parser.add_argument('--ledger', type=int, default=50000, help='Transaction and sale rows in total')
+    parser.add_argument('--days', type=int, default=365)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        parser.error(f'{args.db} already exists')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(args.db)}',
+                      'EXPIRY_SWEEP_SCHEDULER': False, 'METRICS_ENABLED': False})
+    started = time.perf_counter()
+    with app.app_context():
+        generate(args.seed, args.users, args.medicines, args.ledger, args.days)
+    print(json.dumps({'db': args.db, 'seconds': round(time.perf_counter() - started, 1)}))
+
+if __name__ == '__main__':
+    main()
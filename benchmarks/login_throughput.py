@@ -0,0 +1,118 @@
+"""Concurrent login throughput for each password hash setting.
+
+Run from the project folder:
+
+    python -m benchmarks.login_throughput --threads 16 --logins 10 --workers 2
+
+Every method gets a fresh SQLite file with users hashed by that method.
+Each thread posts logins with its own test client; the report gives
+logins/sec, p50/p95 latency and how long a cheap page took meanwhile.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from database import db  # noqa: E402
+from migrations import upgrade_database  # noqa: E402
+from models import User  # noqa: E402
+from benchmarks.run import percentile  # noqa: E402
+
+PASSWORD = 'bench1234'
+METHODS = 'pbkdf2:sha256:100000,pbkdf2:sha256:600000,scrypt:16384:8:1,scrypt:32768:8:1'
+
+def build_app(method, workers, directory, users):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(directory, method.replace(":", "_") + ".db")}',
+        'EXPIRY_SWEEP_SCHEDULER': False,
+        'PASSWORD_HASH_METHOD': method,
+        'PASSWORD_HASH_WORKERS': workers,
+    })
+    with app.app_context():
+        upgrade_database()
+        for number in range(users):
+            user = User(username=f'bench{number}', email=f'bench{number}@example.com')
+            user.set_password(PASSWORD)
+            db.session.add(user)
+        db.session.commit()
+    return app
+
+def run_method(method, workers, directory, threads, logins):
+    app = build_app(method, workers, directory, threads)
+    latencies = []
+    page_latencies = []
+    failed = [0]
+    lock = threading.Lock()
+    start = threading.Barrier(threads + 2)
+    done = threading.Event()
+
+    def worker(number):
+        client = app.test_client()
+        start.wait()
+        mine, errors = [], 0
+        for _ in range(logins):
+            began = time.perf_counter()
+            response = client.post('/login', data={'username': f'bench{number}', 'password': PASSWORD})
+            mine.append((time.perf_counter() - began) * 1000)
+            if response.status_code != 302:
+                errors += 1
+        with lock:
+            latencies.extend(mine)
+            failed[0] += errors
+
+    # A page that needs no hashing, to show whether logins starve other requests
+    def bystander():
+        client = app.test_client()
+        start.wait()
+        while not done.is_set():
+            began = time.perf_counter()
+            client.get('/login')
+            page_latencies.append((time.perf_counter() - began) * 1000)
+
+    pool = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+    watcher = threading.Thread(target=bystander)
+    for thread in pool + [watcher]:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    done.set()
+    watcher.join()
+    with app.app_context():
+        db.engine.dispose()
+
+    return {
+        'method': method,
+        'workers': workers,
+        'threads': threads,
+        'logins': len(latencies),
+        'failed': failed[0],
+        'logins_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50), 1),
+        'p95_ms': round(percentile(latencies, 0.95), 1),
+        'page_p95_ms': round(percentile(page_latencies, 0.95), 1) if page_latencies else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=10, help='Logins per thread')
+    parser.add_argument('--workers', type=int, default=2, help='PASSWORD_HASH_WORKERS')
+    parser.add_argument('--methods', default=METHODS, help='Comma separated werkzeug hash methods')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = [run_method(method, args.workers, directory, args.threads, args.logins)
+                   for method in args.methods.split(',')]
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
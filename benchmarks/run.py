@@ -0,0 +1,188 @@
+"""Request benchmark over the hot pages, reported as JSON.
+
+    python -m benchmarks.run --users 10 --medicines 50000 --ledger 2000000 --output bench.json
+
+Generates a seeded database (or reuses --db), then drives every scenario
+through the Flask test client from --concurrency threads. Each scenario
+reports p50/p95/p99 latency, queries per request and errors; the report
+also has the peak RSS of the process. The page cache is off so every request
+does its real work; --page-cache runs the scenarios again with it on and
+reports those under cached_scenarios. Keep the JSON files from two commits
+and compare them to catch regressions.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import event
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from database import db  # noqa: E402
+from models import User, Medicine  # noqa: E402
+from benchmarks.generate import generate, STEMS  # noqa: E402
+
+SCENARIOS = [
+    ('dashboard', 'GET'),
+    ('medicines_search', 'GET'),
+    ('sales', 'GET'),
+    ('transactions', 'GET'),
+    ('api_medicines', 'GET'),
+    ('inventory_as_of', 'GET'),
+    ('sell_medicine', 'POST'),
+    ('update_stock', 'POST'),
+]
+
+def scenario_request(name, rng, medicine_ids):
+    if name == 'dashboard':
+        return '/dashboard', None
+    if name == 'medicines_search':
+        return f'/medicines?search={rng.choice(STEMS)[:4].lower()}', None
+    if name == 'sales':
+        return '/sales', None
+    if name == 'transactions':
+        return '/transactions', None
+    if name == 'api_medicines':
+        return '/api/medicines', None
+    if name == 'inventory_as_of':
+        at = datetime.utcnow() - timedelta(minutes=rng.randrange(365 * 24 * 60))
+        return f'/api/inventory/as_of?at={at:%Y-%m-%dT%H:%M:%S}', None
+    if name == 'sell_medicine':
+        return f'/sell_medicine/{rng.choice(medicine_ids)}', {'quantity': 1}
+    if name == 'update_stock':
+        return f'/update_stock/{rng.choice(medicine_ids)}', {'action': 'add', 'quantity': 1}
+    raise ValueError(name)
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+def run_scenario(app, name, method, users, requests, threads, seed):
+    counter = threading.local()
+    with app.app_context():
+        engine = db.engine
+
+    def count_query(*args):
+        counter.queries = getattr(counter, 'queries', 0) + 1
+
+    event.listen(engine, 'before_cursor_execute', count_query)
+    latencies = []
+    queries = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        user_id, medicine_ids = users[index % len(users)]
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+        mine_latency, mine_queries, mine_errors = [], [], 0
+        for _ in range(requests // threads):
+            url, data = scenario_request(name, rng, medicine_ids)
+            counter.queries = 0
+            started = time.perf_counter()
+            response = client.post(url, data=data) if method == 'POST' else client.get(url)
+            response.get_data()
+            mine_latency.append((time.perf_counter() - started) * 1000)
+            mine_queries.append(counter.queries)
+            if response.status_code >= 400:
+                mine_errors += 1
+        with lock:
+            latencies.extend(mine_latency)
+            queries.extend(mine_queries)
+            errors[0] += mine_errors
+
+    pool = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    event.remove(engine, 'before_cursor_execute', count_query)
+
+    return {
+        'requests': len(latencies),
+        'concurrency': threads,
+        'errors': errors[0],
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2),
+        'max_queries': max(queries),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot pages')
+    parser.add_argument('--db', help='Existing benchmark database to reuse, generated when missing')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--medicines', type=int, default=2000, help='Medicines per user')
+    parser.add_argument('--ledger', type=int, default=50000, help='Transaction and sale rows in total')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--scenarios', help='Comma separated subset of: ' + ', '.join(s[0] for s in SCENARIOS))
+    parser.add_argument('--page-cache', action='store_true',
+                        help='Also run every scenario with the page cache on')
+    parser.add_argument('--output', help='Write the JSON report here as well as to stdout')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp() if not args.db else None
+    path = os.path.abspath(args.db or os.path.join(directory, 'bench.db'))
+
+    def build_app(page_cache):
+        return create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'EXPIRY_SWEEP_SCHEDULER': False,
+                           'PAGE_CACHE_ENABLED': page_cache})
+
+    app = build_app(False)
+
+    report = {'config': vars(args), 'database': path}
+    with app.app_context():
+        if not os.path.exists(path) or not db.session.query(User.id).first():
+            started = time.perf_counter()
+            generate(args.seed, args.users, args.medicines, args.ledger)
+            report['generate_seconds'] = round(time.perf_counter() - started, 1)
+        users = [
+            (user.id, [medicine_id for (medicine_id,) in db.session.query(Medicine.id).filter_by(user_id=user.id)])
+            for user in User.query.order_by(User.id)
+        ]
+
+    wanted = set(args.scenarios.split(',')) if args.scenarios else None
+    for key, page_cache in (('scenarios', False), ('cached_scenarios', True)):
+        if page_cache and not args.page_cache:
+            continue
+        # create_app configures the one page cache, so the cached app is made
+        # only once the uncached runs are done
+        run_app = build_app(True) if page_cache else app
+        report[key] = {}
+        for name, method in SCENARIOS:
+            if wanted is None or name in wanted:
+                report[key][name] = run_scenario(run_app, name, method, users,
+                                                 args.requests, args.concurrency, args.seed)
+    report['peak_rss_mb'] = peak_rss_mb()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Concurrent sell_medicine throughput under each database profile.
+
+Run from the project folder:
+
+    python -m benchmarks.sell_concurrency --threads 16 --sales 50
+
+Every profile gets a fresh SQLite file with the same data. Each thread logs
+in with its own test client and posts sales to random medicines. The report
+gives sales/sec, failed requests and whether stock and sales still agree.
+"""
+from datetime import date, timedelta
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from database import db  # noqa: E402
+from migrations import upgrade_database  # noqa: E402
+from models import User, Medicine, Sale  # noqa: E402
+
+INITIAL_STOCK = 1_000_000
+
+def build_app(profile, directory, medicines):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(directory, profile + ".db")}',
+        'DB_PROFILE': profile,
+        'EXPIRY_SWEEP_SCHEDULER': False,
+    })
+    with app.app_context():
+        upgrade_database()
+        user = User(username='bench', email='bench@example.com')
+        user.set_password('bench1234')
+        db.session.add(user)
+        db.session.flush()
+        expiry = date.today() + timedelta(days=365)
+        db.session.add_all(
+            Medicine(name=f'Medicine {i}', batch_number=f'B{i}', category='tablet', quantity=INITIAL_STOCK,
+                     price=2.0, expiry_date=expiry, low_stock_alert=10, user_id=user.id)
+            for i in range(medicines)
+        )
+        db.session.commit()
+        return app, user.id, [medicine.id for medicine in Medicine.query]
+
+def run_profile(profile, directory, threads, sales, medicines):
+    app, user_id, medicine_ids = build_app(profile, directory, medicines)
+    counts = {'ok': 0, 'failed': 0}
+    lock = threading.Lock()
+    start = threading.Barrier(threads + 1)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+        start.wait()
+        ok = failed = 0
+        for _ in range(sales):
+            try:
+                response = client.post(f'/sell_medicine/{rng.choice(medicine_ids)}', data={'quantity': 1})
+                if response.status_code == 302:
+                    ok += 1
+                else:
+                    failed += 1
+            except Exception:
+                failed += 1
+        with lock:
+            counts['ok'] += ok
+            counts['failed'] += failed
+
+    pool = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for thread in pool:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    with app.app_context():
+        sold = db.session.query(db.func.coalesce(db.func.sum(Sale.quantity), 0)).scalar()
+        stock = db.session.query(db.func.sum(Medicine.quantity)).scalar()
+        consistent = stock + sold == INITIAL_STOCK * len(medicine_ids)
+        db.engine.dispose()
+
+    return {
+        'profile': profile,
+        'threads': threads,
+        'requests': threads * sales,
+        'sold': counts['ok'],
+        'failed': counts['failed'],
+        'seconds': round(elapsed, 3),
+        'sales_per_second': round(counts['ok'] / elapsed, 1),
+        'consistent': consistent,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--sales', type=int, default=50, help='Sales per thread')
+    parser.add_argument('--medicines', type=int, default=20)
+    parser.add_argument('--profiles', default='default,tuned')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = [run_profile(profile, directory, args.threads, args.sales, args.medicines)
+                   for profile in args.profiles.split(',')]
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Cold start time and per-render cost of the app.
+
+Run from the project folder:
+
+    python -m benchmarks.startup --runs 5 --renders 2000
+
+Cold starts run in fresh interpreters against one generated SQLite file.
+`wsgi` imports wsgi.py, which does no schema work and compiles the
+templates up front; `dev` does what `python app.py` does before serving,
+create_app() followed by upgrade_database(). Each run reports the time until
+the app is ready and the time its first dashboard request takes. The render
+part times the template context processors and a full page render against
+the earlier processors, which rebuilt the navigation links and category
+list on every render.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from flask import render_template, url_for  # noqa: E402
+from app import create_app, inject_current_date, inject_navigation  # noqa: E402
+from benchmarks.generate import generate  # noqa: E402
+
+# Runs in the child interpreter: argv[1] is the mode
+COLD_START = '''
+import json, sys, time
+started = time.perf_counter()
+if sys.argv[1] == 'wsgi':
+    from wsgi import app
+else:
+    from app import create_app
+    from migrations import upgrade_database
+    app = create_app()
+    with app.app_context():
+        upgrade_database()
+ready = time.perf_counter()
+client = app.test_client()
+client.post('/login', data={'username': 'bench0', 'password': 'bench1234'})
+began = time.perf_counter()
+response = client.get('/dashboard')
+print(json.dumps({'ready_ms': (ready - started) * 1000,
+                  'first_page_ms': (time.perf_counter() - began) * 1000,
+                  'status': response.status_code}))
+'''
+
+# The context processors as they were before the constants were precomputed
+def legacy_current_date():
+    from datetime import date
+    return {'current_date': date.today()}
+
+def legacy_navigation():
+    categories = ['tablet', 'syrup', 'capsule', 'ointment', 'injection', 'drops', 'inhaler', 'cream', 'gel', 'powder']
+    return {
+        'navigation': [
+            {'name': 'Dashboard', 'url': url_for('main.dashboard'), 'icon': 'fas fa-tachometer-alt'},
+            {'name': 'All Medicines', 'url': url_for('main.medicines'), 'icon': 'fas fa-pills'},
+            {'name': 'Add Medicine', 'url': url_for('main.add_medicine'), 'icon': 'fas fa-plus'},
+            {'name': 'Import', 'url': url_for('main.import_medicines_page'), 'icon': 'fas fa-file-import'},
+            {'name': 'Expired Medicines', 'url': url_for('main.expired_medicines'), 'icon': 'fas fa-exclamation-triangle'},
+            {'name': 'Sales', 'url': url_for('main.sales'), 'icon': 'fas fa-shopping-cart'},
+            {'name': 'Transactions', 'url': url_for('main.transactions'), 'icon': 'fas fa-exchange-alt'},
+        ],
+        'categories': categories
+    }
+
+def cold_start(mode, path, runs):
+    env = dict(os.environ, SECRET_KEY='bench-secret', DATABASE_URL=f'sqlite:///{path}',
+               EXPIRY_SWEEP_SCHEDULER='0', METRICS_ENABLED='0')
+    results = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', COLD_START, mode], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+    return {
+        'runs': runs,
+        'ready_ms': round(statistics.median(result['ready_ms'] for result in results), 1),
+        'first_page_ms': round(statistics.median(result['first_page_ms'] for result in results), 1),
+        'statuses': sorted({result['status'] for result in results}),
+    }
+
+def per_call_us(function, calls):
+    began = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return round((time.perf_counter() - began) / calls * 1_000_000, 2)
+
+# Time the processors alone and a render of login.html, which extends base.html
+def render_costs(path, renders):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'METRICS_ENABLED': False})
+    processors = app.template_context_processors[None]
+    current = (inject_current_date, inject_navigation)
+    legacy = (legacy_current_date, legacy_navigation)
+    positions = [processors.index(function) for function in current]
+
+    def use(functions):
+        for position, function in zip(positions, functions):
+            processors[position] = function
+
+    def render():
+        render_template('login.html')
+
+    report = {}
+    with app.test_request_context('/login'):
+        render()
+        for name, functions in (('legacy', legacy), ('current', current)):
+            use(functions)
+            report[name] = {
+                'processors_us': per_call_us(lambda: [function() for function in functions], renders),
+                'render_us': per_call_us(render, renders),
+            }
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='Cold starts per mode')
+    parser.add_argument('--renders', type=int, default=2000)
+    parser.add_argument('--medicines', type=int, default=2000, help='Medicines per generated user')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'startup.db')
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'METRICS_ENABLED': False})
+        with app.app_context():
+            generate(medicines=args.medicines, ledger=args.medicines * 10)
+        report = {
+            'cold_start': {mode: cold_start(mode, path, args.runs) for mode in ('dev', 'wsgi')},
+            'render': render_costs(path, args.renders),
+        }
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+from database import db
+from models import Medicine, Transaction, ExpiredMedicine
+from summary import adjust_summary, touch_inventory, forget_medicine_sales
+from search import filter_by_search
+from expiry import record_expired
+from datetime import datetime, date
+
+MAX_BULK_IDS = 5000
+BULK_FILTERS = ('category', 'search', 'expires_before', 'expired')
+
+# The medicines of user_id a bulk request applies to, as a WHERE condition on
+# the medicine table. Requests give an `ids` list, a `filter` object or both;
+# raises ValueError on malformed input.
+def parse_selection(data, user_id, required=True, today=None):
+    ids = data.get('ids')
+    filters = data.get('filter') or {}
+    if not isinstance(filters, dict):
+        raise ValueError('filter must be an object')
+    unknown = set(filters) - set(BULK_FILTERS)
+    if unknown:
+        raise ValueError(f'Unknown filter: {", ".join(sorted(unknown))}')
+    if required and ids is None and not filters:
+        raise ValueError('Give ids or a filter')
+
+    statement = db.select(Medicine.id)
+    if ids is not None:
+        if not isinstance(ids, list) or not ids:
+            raise ValueError('ids must be a non-empty list')
+        if len(ids) > MAX_BULK_IDS:
+            raise ValueError(f'At most {MAX_BULK_IDS} ids per request')
+        try:
+            statement = statement.where(Medicine.id.in_([int(medicine_id) for medicine_id in ids]))
+        except (TypeError, ValueError):
+            raise ValueError('ids must be numbers')
+    if filters.get('category'):
+        statement = statement.where(Medicine.category == str(filters['category']))
+    if filters.get('search'):
+        searched = filter_by_search(statement, str(filters['search']).strip(), user_id)
+        if searched is statement:
+            raise ValueError('search has no words to match')
+        statement = searched
+    if filters.get('expires_before'):
+        try:
+            expires_before = date.fromisoformat(str(filters['expires_before']))
+        except ValueError:
+            raise ValueError('expires_before must be in YYYY-MM-DD format')
+        statement = statement.where(Medicine.expiry_date < expires_before)
+    if filters.get('expired'):
+        statement = statement.where(Medicine.expiry_date < (today or date.today()))
+    return statement.whereclause if statement.whereclause is not None else db.true()
+
+# Field changes of a bulk update, raises ValueError on malformed input
+def parse_changes(data):
+    changes = {}
+    try:
+        if data.get('price') is not None:
+            changes['price'] = float(data['price'])
+        if data.get('price_percent') is not None:
+            changes['price_percent'] = float(data['price_percent'])
+    except (TypeError, ValueError):
+        raise ValueError('price and price_percent must be numbers')
+    if 'price' in changes and 'price_percent' in changes:
+        raise ValueError('Give either price or price_percent, not both')
+    if changes.get('price', 0) < 0:
+        raise ValueError('price cannot be negative')
+    if changes.get('price_percent', 0) <= -100:
+        raise ValueError('price_percent must be greater than -100')
+    if data.get('category') is not None:
+        category = str(data['category']).strip()
+        if not category or len(category) > 50:
+            raise ValueError('category must be 1 to 50 characters')
+        changes['category'] = category
+    if not changes:
+        raise ValueError('Nothing to change, give price, price_percent or category')
+    return changes
+
+def _totals(selected):
+    return db.session.execute(db.select(
+        db.func.count(Medicine.id),
+        db.func.coalesce(db.func.sum(Medicine.quantity * Medicine.price), 0)
+    ).where(selected)).one()
+
+# Reprice and/or recategorise the selected medicines in one UPDATE.
+# Returns how many medicines changed.
+def bulk_update(user_id, condition, changes):
+    selected = db.and_(Medicine.user_id == user_id, condition)
+    values = {}
+    if 'price' in changes:
+        values['price'] = changes['price']
+    elif 'price_percent' in changes:
+        factor = 1 + changes['price_percent'] / 100
+        values['price'] = db.func.round(db.cast(Medicine.price * factor, db.Numeric), 2)
+    if 'category' in changes:
+        values['category'] = changes['category']
+
+    # The stock value change is worked out before the rows move out of a
+    # category filter
+    if 'price' in values:
+        value_change = db.session.scalar(db.select(
+            db.func.coalesce(db.func.sum(Medicine.quantity * (values['price'] - Medicine.price)), 0)
+        ).where(selected))
+        adjust_summary(user_id, total_stock_value=value_change)
+
+    result = db.session.execute(db.update(Medicine).where(selected).values(**values),
+                                execution_options={'synchronize_session': False})
+    touch_inventory(user_id)
+    db.session.commit()
+    return result.rowcount
+
+# Delete the selected medicines with one DELETE; their transactions, sales,
+# archived rows, expired records, sales rollups and snapshots go with them
+# through ON DELETE CASCADE. Returns how many medicines were deleted.
+def delete_medicines(user_id, condition):
+    selected = db.and_(Medicine.user_id == user_id, condition)
+    selected_ids = db.select(Medicine.id).where(selected)
+
+    count, stock_value = _totals(selected)
+    if not count:
+        return 0
+    expired_count, expired_value = db.session.execute(db.select(
+        db.func.count(ExpiredMedicine.id),
+        db.func.coalesce(db.func.sum(ExpiredMedicine.original_value), 0)
+    ).where(ExpiredMedicine.medicine_id.in_(selected_ids))).one()
+    adjust_summary(user_id,
+                   total_medicines=-count,
+                   total_stock_value=-stock_value,
+                   expired_medicines=-expired_count,
+                   expired_stock_value=-expired_value)
+    forget_medicine_sales(user_id, selected_ids)
+
+    db.session.execute(db.delete(Medicine).where(selected), execution_options={'synchronize_session': 'fetch'})
+    touch_inventory(user_id)
+    db.session.commit()
+    return count
+
+# Write off the stock of the selected medicines that have expired: record
+# them in the expired table if the sweep has not yet, book an 'out'
+# transaction for what was left and set their quantity to 0.
+# Returns the number of medicines and the stock value written off.
+def dispose_expired(user_id, condition):
+    today = date.today()
+    now = datetime.utcnow()
+    selected = db.and_(Medicine.user_id == user_id, condition,
+                       Medicine.expiry_date < today, Medicine.quantity > 0)
+
+    record_expired(selected, today, now)
+    count, stock_value = _totals(selected)
+    if not count:
+        db.session.commit()
+        return 0, 0
+
+    db.session.execute(db.insert(Transaction).from_select(
+        ['medicine_id', 'user_id', 'transaction_type', 'quantity', 'transaction_date', 'notes'],
+        db.select(Medicine.id, Medicine.user_id, db.literal('out'), Medicine.quantity,
+                  db.literal(now, db.DateTime), db.literal('Disposed (expired)')).where(selected)
+    ))
+    db.session.execute(db.update(Medicine).where(selected).values(quantity=0),
+                       execution_options={'synchronize_session': False})
+    adjust_summary(user_id, total_stock_value=-stock_value)
+    touch_inventory(user_id)
+    db.session.commit()
+    return count, stock_value
@@ -0,0 +1,96 @@
+from database import db
+from models import Medicine, Transaction, Sale
+from summary import adjust_summary, record_sale, touch_inventory
+from alerts import alert_kinds, publish_new_alerts
+from datetime import datetime
+
+# Change a medicine's stock in the database itself. Decrements only apply when
+# enough stock is left, so concurrent sales can't oversell.
+# Returns the new quantity, or None when the stock was insufficient.
+def change_stock(medicine_id, delta):
+    statement = db.update(Medicine).where(Medicine.id == medicine_id)
+    if delta < 0:
+        statement = statement.where(Medicine.quantity >= -delta)
+    return db.session.execute(
+        statement.values(quantity=Medicine.quantity + delta).returning(Medicine.quantity),
+        execution_options={'synchronize_session': 'fetch'}
+    ).scalar_one_or_none()
+
+# Read checkout lines from JSON, raises ValueError on malformed input
+def parse_lines(items):
+    if not isinstance(items, list) or not items:
+        raise ValueError('At least one item is required')
+    lines = []
+    for number, item in enumerate(items, start=1):
+        try:
+            medicine_id = int(item['medicine_id'])
+            quantity = int(item['quantity'])
+            price = float(item['price']) if item.get('price') not in (None, '') else None
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f'Item {number}: medicine_id and quantity must be numbers')
+        if quantity <= 0:
+            raise ValueError(f'Item {number}: quantity must be greater than 0')
+        if price is not None and price < 0:
+            raise ValueError(f'Item {number}: price cannot be negative')
+        lines.append((medicine_id, quantity, price))
+    return lines
+
+# Sell every line of a basket in one transaction. Either all stock decrements,
+# sales and ledger rows are committed or none are; raises ValueError otherwise.
+def checkout(user_id, lines, customer_name='', notes=''):
+    medicine_ids = {medicine_id for medicine_id, quantity, price in lines}
+    medicines = {
+        medicine.id: medicine
+        for medicine in Medicine.query.filter(Medicine.id.in_(medicine_ids), Medicine.user_id == user_id)
+    }
+    missing = medicine_ids - medicines.keys()
+    if missing:
+        raise ValueError(f'Medicine not found: {", ".join(str(medicine_id) for medicine_id in sorted(missing))}')
+    old_alerts = {medicine_id: alert_kinds(medicine) for medicine_id, medicine in medicines.items()}
+
+    now = datetime.utcnow()
+    sales = []
+    transactions = []
+    stock_value = 0
+    try:
+        for medicine_id, quantity, price in lines:
+            medicine = medicines[medicine_id]
+            sale_price = medicine.price if price is None else price
+            if change_stock(medicine_id, -quantity) is None:
+                available = db.session.query(Medicine.quantity).filter(Medicine.id == medicine_id).scalar()
+                raise ValueError(f'Insufficient stock for {medicine.name}. Available: {available}')
+
+            stock_value += quantity * medicine.price
+            sales.append({
+                'medicine_id': medicine_id,
+                'user_id': user_id,
+                'quantity': quantity,
+                'sale_price': sale_price,
+                'total_amount': quantity * sale_price,
+                'customer_name': customer_name,
+                'sale_date': now,
+                'notes': notes
+            })
+            transactions.append({
+                'medicine_id': medicine_id,
+                'user_id': user_id,
+                'transaction_type': 'out',
+                'quantity': quantity,
+                'transaction_date': now,
+                'notes': f'Sold to {customer_name}. {notes}'
+            })
+    except ValueError:
+        db.session.rollback()
+        raise
+
+    db.session.execute(db.insert(Sale), sales)
+    db.session.execute(db.insert(Transaction), transactions)
+
+    total_amount = sum(sale['total_amount'] for sale in sales)
+    adjust_summary(user_id, total_stock_value=-stock_value)
+    record_sale(user_id, sales, now)
+    touch_inventory(user_id)
+    db.session.commit()
+    for medicine_id, medicine in medicines.items():
+        publish_new_alerts(medicine, old_alerts[medicine_id])
+    return total_amount
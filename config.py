@@ -0,0 +1,69 @@
+import os
+
+# Development fallback, wsgi.py refuses to start with it
+DEFAULT_SECRET_KEY = 'your-secret-key-here'
+
+# Settings read by create_app(). Every value can be overridden from the
+# environment or by passing a mapping to create_app().
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY', DEFAULT_SECRET_KEY)
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///medicine_tracker.db')
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    EXPIRY_SWEEP_SCHEDULER = os.environ.get('EXPIRY_SWEEP_SCHEDULER', '1') == '1'
+
+    # archive-ledger moves transactions and sales older than this many days
+    # into the archive tables, this many rows per transaction
+    LEDGER_ARCHIVE_DAYS = int(os.environ.get('LEDGER_ARCHIVE_DAYS', 365))
+    LEDGER_ARCHIVE_BATCH_SIZE = int(os.environ.get('LEDGER_ARCHIVE_BATCH_SIZE', 1000))
+
+    # Daily stock snapshots are kept this many days, older ones are thinned
+    # to one per month
+    STOCK_SNAPSHOT_KEEP_DAYS = int(os.environ.get('STOCK_SNAPSHOT_KEEP_DAYS', 90))
+
+    # werkzeug hash method for passwords, e.g. 'scrypt:32768:8:1' or
+    # 'pbkdf2:sha256:600000'. Older hashes are upgraded on login. At most
+    # PASSWORD_HASH_WORKERS hashes are computed at once.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+
+    # Seconds between keepalive comments on the alert event stream, between
+    # its checks for new alerts, and days alerts are kept for streams to resume
+    ALERT_KEEPALIVE = int(os.environ.get('ALERT_KEEPALIVE', 15))
+    ALERT_POLL_SECONDS = float(os.environ.get('ALERT_POLL_SECONDS', 2))
+    ALERT_KEEP_DAYS = int(os.environ.get('ALERT_KEEP_DAYS', 7))
+
+    # Users kept in memory by the login user loader, TTL in seconds
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
+
+    # Rendered pages and JSON per user, invalidated by every write. Set
+    # PAGE_CACHE_DIR to share the cache between worker processes on one host.
+    PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', '1') == '1'
+    PAGE_CACHE_MAX_BYTES = int(os.environ.get('PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    PAGE_CACHE_MAX_ENTRY_BYTES = int(os.environ.get('PAGE_CACHE_MAX_ENTRY_BYTES', 2 * 1024 * 1024))
+    PAGE_CACHE_DIR = os.environ.get('PAGE_CACHE_DIR', '')
+
+    # Per-endpoint histograms at /metrics; queries slower than SLOW_QUERY_MS
+    # are logged with their route (0 turns the slow query log off)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 200))
+
+    # 'tuned' applies the SQLite pragmas and pool settings below, 'default'
+    # leaves the driver defaults alone
+    DB_PROFILE = os.environ.get('DB_PROFILE', 'tuned')
+
+    # Applied to every new SQLite connection
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),  # negative means KiB
+        'temp_store': 'MEMORY',
+    }
+
+    # Connection pool for server databases such as PostgreSQL
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
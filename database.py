@@ -1,3 +1,37 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy()
+
+# Engine options for the configured database and profile
+def engine_options(config):
+    if config['DB_PROFILE'] != 'tuned':
+        return {}
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        # Wait for the write lock in the driver as well as in SQLite itself
+        return {'connect_args': {'timeout': config['SQLITE_PRAGMAS'].get('busy_timeout', 5000) / 1000}}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+
+# Apply the SQLite pragmas to every connection the engine opens. Foreign keys
+# are always enforced, since deleting a medicine relies on ON DELETE CASCADE.
+def configure_engine(engine, config):
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = {'foreign_keys': 'ON'}
+    if config['DB_PROFILE'] == 'tuned':
+        pragmas.update(config['SQLITE_PRAGMAS'])
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
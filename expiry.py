@@ -0,0 +1,109 @@
+from database import db
+from models import Medicine, ExpiredMedicine, ExpirySweep
+from summary import adjust_summary, touch_inventory
+from alerts import publish_daily_alerts, prune_alerts
+from stock_snapshots import take_stock_snapshot
+from datetime import datetime, date, timedelta
+import threading
+import time
+
+# Copy the expired, in-stock medicines matching `condition` that are not in
+# the expired table yet into it in one INSERT ... SELECT ... WHERE NOT EXISTS,
+# and fold them into each user's dashboard summary. Returns how many moved.
+def record_expired(condition, today, expired_at):
+    last_expired_id = db.session.query(db.func.max(ExpiredMedicine.id)).scalar() or 0
+
+    candidates = db.select(
+        Medicine.id,
+        Medicine.user_id,
+        Medicine.name,
+        Medicine.batch_number,
+        Medicine.category,
+        Medicine.quantity,
+        Medicine.price,
+        Medicine.expiry_date,
+        Medicine.quantity * Medicine.price,
+        db.literal(expired_at, db.DateTime)
+    ).where(
+        condition,
+        Medicine.expiry_date < today,
+        Medicine.quantity > 0,
+        ~db.exists().where(ExpiredMedicine.medicine_id == Medicine.id)
+    )
+
+    db.session.execute(db.insert(ExpiredMedicine).from_select([
+        'medicine_id', 'user_id', 'name', 'batch_number', 'category',
+        'quantity', 'price', 'expiry_date', 'original_value', 'expired_at'
+    ], candidates))
+
+    # Fold the newly moved rows into each user's dashboard summary
+    moved = db.session.query(
+        ExpiredMedicine.user_id,
+        db.func.count(ExpiredMedicine.id),
+        db.func.sum(ExpiredMedicine.original_value)
+    ).filter(ExpiredMedicine.id > last_expired_id).group_by(ExpiredMedicine.user_id).all()
+
+    moved_count = 0
+    for user_id, count, value in moved:
+        adjust_summary(user_id, expired_medicines=count, expired_stock_value=value)
+        touch_inventory(user_id)
+        moved_count += count
+    return moved_count
+
+# Move every expired, in-stock medicine of all users into the expired table.
+# Unless full=True only medicines that expired since the last sweep are looked
+# at, plus those changed since it started: a medicine that expired with no
+# stock is skipped, and is picked up once it is restocked.
+def sweep_expired_medicines(full=False):
+    started = time.perf_counter()
+    today = date.today()
+
+    last_sweep = None if full else ExpirySweep.query.order_by(ExpirySweep.id.desc()).first()
+    if last_sweep is None:
+        conditions = [db.true()]
+    else:
+        # Two passes rather than an OR, so each one searches its own index
+        conditions = [Medicine.expiry_date >= last_sweep.swept_through,
+                      Medicine.updated_at >= last_sweep.started_at]
+
+    expired_at = datetime.utcnow()
+    moved_count = sum(record_expired(condition, today, expired_at) for condition in conditions)
+
+    sweep = ExpirySweep(
+        started_at=expired_at,
+        swept_through=today,
+        moved_count=moved_count,
+        duration_ms=(time.perf_counter() - started) * 1000
+    )
+    db.session.add(sweep)
+    db.session.commit()
+    return sweep
+
+def _seconds_until_tomorrow():
+    tomorrow = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+    return max((tomorrow - datetime.now()).total_seconds(), 1)
+
+# Run the sweep at start-up and then once per day from a daemon thread, which
+# also publishes the day's new expiry alerts, prunes old ones and takes the
+# day's stock snapshot
+def start_expiry_scheduler(app):
+    stop = threading.Event()
+
+    def run():
+        while not stop.is_set():
+            with app.app_context():
+                try:
+                    sweep = sweep_expired_medicines()
+                    app.logger.info('Expiry sweep moved %d medicines in %.1f ms',
+                                    sweep.moved_count, sweep.duration_ms)
+                    publish_daily_alerts(sweep)
+                    prune_alerts(app.config['ALERT_KEEP_DAYS'])
+                    take_stock_snapshot(keep_days=app.config['STOCK_SNAPSHOT_KEEP_DAYS'])
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Expiry sweep failed')
+            stop.wait(_seconds_until_tomorrow())
+
+    thread = threading.Thread(target=run, name='expiry-sweep', daemon=True)
+    thread.start()
+    return stop
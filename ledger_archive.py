@@ -0,0 +1,55 @@
+from database import db
+from models import Transaction, Sale, ArchivedTransaction, ArchivedSale, LedgerArchiveRun
+from datetime import datetime, timedelta
+import time
+
+# Hot table, archive table and date column of each ledger
+LEDGERS = (
+    (Transaction, ArchivedTransaction, 'transaction_date'),
+    (Sale, ArchivedSale, 'sale_date'),
+)
+
+# Move the next batch_size rows after after_id dated before cutoff into the
+# archive in one short transaction, returns their ids. Walking the ids
+# upwards means every batch carries on where the previous one stopped.
+def _archive_batch(model, archive_model, date_column, cutoff, after_id, batch_size):
+    ids = db.session.scalars(
+        db.select(model.id).where(model.id > after_id, getattr(model, date_column) < cutoff)
+        .order_by(model.id).limit(batch_size)
+    ).all()
+    if not ids:
+        return ids
+    columns = [column.name for column in model.__table__.columns]
+    db.session.execute(db.insert(archive_model).from_select(
+        columns, db.select(*[getattr(model, column) for column in columns]).where(model.id.in_(ids))
+    ))
+    db.session.execute(db.delete(model).where(model.id.in_(ids)))
+    db.session.commit()
+    return ids
+
+# Move transactions and sales older than `days` into the archive tables in
+# batches. Each batch commits on its own, so the write lock is only held
+# briefly and an interrupted run simply continues where it stopped next time.
+# Sales totals are unaffected because they come from the sales rollups.
+def archive_ledger(days, batch_size=1000, pause=0):
+    started = time.perf_counter()
+    run = LedgerArchiveRun(started_at=datetime.utcnow(), cutoff=datetime.utcnow() - timedelta(days=days))
+    moved = {}
+    for model, archive_model, date_column in LEDGERS:
+        moved[model] = 0
+        after_id = 0
+        while True:
+            ids = _archive_batch(model, archive_model, date_column, run.cutoff, after_id, batch_size)
+            moved[model] += len(ids)
+            if len(ids) < batch_size:
+                break
+            after_id = ids[-1]
+            if pause:
+                time.sleep(pause)
+
+    run.moved_transactions = moved[Transaction]
+    run.moved_sales = moved[Sale]
+    run.duration_ms = (time.perf_counter() - started) * 1000
+    db.session.add(run)
+    db.session.commit()
+    return run
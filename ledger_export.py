@@ -0,0 +1,176 @@
+from database import db
+from models import Medicine, Transaction, Sale, ArchivedTransaction, ArchivedSale, ExpiredMedicine
+from pagination import apply_date_range
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+import csv
+import io
+import zipfile
+import zlib
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+# Column headings and row statements of each export. Ledger exports read the
+# archive first and then the live table, so rows come out oldest first.
+def _sale_statement(model):
+    return db.select(
+        model.sale_date, Medicine.name, Medicine.batch_number, model.quantity, model.sale_price,
+        model.total_amount, model.customer_name, model.notes
+    ).join(Medicine, Medicine.id == model.medicine_id)
+
+def _transaction_statement(model):
+    return db.select(
+        model.transaction_date, Medicine.name, Medicine.batch_number, model.transaction_type,
+        model.quantity, model.notes
+    ).join(Medicine, Medicine.id == model.medicine_id)
+
+EXPORTS = {
+    'sales': (
+        ('Date', 'Medicine', 'Batch No.', 'Quantity', 'Unit Price', 'Total Amount', 'Customer', 'Notes'),
+        ((ArchivedSale, 'sale_date', _sale_statement), (Sale, 'sale_date', _sale_statement)),
+    ),
+    'transactions': (
+        ('Date', 'Medicine', 'Batch No.', 'Type', 'Quantity', 'Notes'),
+        ((ArchivedTransaction, 'transaction_date', _transaction_statement),
+         (Transaction, 'transaction_date', _transaction_statement)),
+    ),
+    'expired': (
+        ('Expired At', 'Medicine', 'Batch No.', 'Category', 'Quantity', 'Price', 'Expiry Date', 'Original Value'),
+        ((ExpiredMedicine, 'expired_at', lambda model: db.select(
+            model.expired_at, model.name, model.batch_number, model.category, model.quantity,
+            model.price, model.expiry_date, model.original_value
+        )),),
+    ),
+}
+
+# Heading and the statements whose rows make up an export, dates inclusive
+def export_statements(kind, user_id, start=None, end=None, medicine_id=None):
+    header, sources = EXPORTS[kind]
+    statements = []
+    for model, date_column, build in sources:
+        statement = build(model).where(model.user_id == user_id)
+        if medicine_id:
+            statement = statement.where(model.medicine_id == medicine_id)
+        column = getattr(model, date_column)
+        statements.append(apply_date_range(statement, column, start, end).order_by(column, model.id))
+    return header, statements
+
+def _batches(statements):
+    for statement in statements:
+        result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        yield from result.partitions()
+
+def _text(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+# CSV bytes, one chunk per batch of rows
+def generate_csv(header, statements):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for rows in _batches(statements):
+        writer.writerows([_text(value) for value in row] for row in rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+# Collects what ZipFile writes so it can be yielded as it is produced. With
+# no tell() ZipFile treats it as a stream and writes data descriptors.
+class _ZipStream:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{sheet}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if value is None:
+            cells.append('<c/>')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            cells.append(f'<c t="inlineStr"><is><t>{escape(str(_text(value)))}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+# A single sheet workbook written straight into a streamed zip, so only one
+# batch of rows is held at a time
+def generate_xlsx(header, statements, sheet='Export'):
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content.replace('{sheet}', escape(sheet)))
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as worksheet:
+            worksheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                            b'<sheetData>')
+            worksheet.write(_xlsx_row(header).encode('utf-8'))
+            for rows in _batches(statements):
+                worksheet.write(''.join(_xlsx_row(row) for row in rows).encode('utf-8'))
+                yield stream.drain()
+            worksheet.write(b'</sheetData></worksheet>')
+    yield stream.drain()
+
+def generate_export(file_format, header, statements, sheet='Export'):
+    if file_format == 'xlsx':
+        return generate_xlsx(header, statements, sheet)
+    return generate_csv(header, statements)
+
+# Gzip a stream of byte chunks
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,68 @@
+from database import db
+from models import Medicine
+from datetime import timedelta
+import json
+
+# Fields of the /api/medicines feed: the medicine columns each one needs and
+# how it is rendered from a row. Derived flags share the thresholds of the request.
+FEED_FIELDS = {
+    'id': (('id',), lambda row, today, threshold: row.id),
+    'name': (('name',), lambda row, today, threshold: row.name),
+    'batch_number': (('batch_number',), lambda row, today, threshold: row.batch_number),
+    'category': (('category',), lambda row, today, threshold: row.category),
+    'quantity': (('quantity',), lambda row, today, threshold: row.quantity),
+    'price': (('price',), lambda row, today, threshold: row.price),
+    'expiry_date': (('expiry_date',), lambda row, today, threshold: row.expiry_date.isoformat()),
+    'low_stock_alert': (('low_stock_alert',), lambda row, today, threshold: row.low_stock_alert),
+    'is_expired': (('expiry_date',), lambda row, today, threshold: row.expiry_date < today),
+    'is_low_stock': (('quantity', 'low_stock_alert'),
+                     lambda row, today, threshold: row.quantity <= row.low_stock_alert),
+    'is_expiring_soon': (('expiry_date',), lambda row, today, threshold: row.expiry_date <= threshold),
+    'updated_at': (('updated_at',),
+                   lambda row, today, threshold: row.updated_at.isoformat() if row.updated_at else None),
+}
+
+# Returned when no ?fields= is given
+DEFAULT_FIELDS = ('id', 'name', 'batch_number', 'category', 'quantity', 'price', 'expiry_date',
+                  'low_stock_alert', 'is_expired', 'is_low_stock', 'is_expiring_soon')
+
+FEED_BATCH_SIZE = 500
+
+# Parse ?fields=a,b into a tuple of field names, raises ValueError on unknown names
+def parse_fields(value):
+    if not value:
+        return DEFAULT_FIELDS
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in FEED_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}' if unknown else 'No fields requested')
+    return fields
+
+# Select only the columns the requested fields need
+def feed_statement(user_id, fields, since=None):
+    columns = {'id'}
+    for field in fields:
+        columns.update(FEED_FIELDS[field][0])
+    statement = db.select(*(getattr(Medicine, column) for column in sorted(columns))).where(
+        Medicine.user_id == user_id
+    )
+    if since is not None:
+        statement = statement.where(Medicine.updated_at > since)
+    return statement.order_by(Medicine.id)
+
+# Yield the JSON array in chunks, one chunk per batch of rows
+def generate_feed(statement, fields, today):
+    threshold = today + timedelta(days=30)
+    renderers = [(field, FEED_FIELDS[field][1]) for field in fields]
+    result = db.session.execute(statement.execution_options(yield_per=FEED_BATCH_SIZE))
+
+    yield '['
+    separator = ''
+    for rows in result.partitions():
+        chunk = ','.join(
+            json.dumps({field: render(row, today, threshold) for field, render in renderers})
+            for row in rows
+        )
+        yield separator + chunk
+        separator = ','
+    yield ']'
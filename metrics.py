@@ -0,0 +1,135 @@
+from database import db
+from flask import Response, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+import logging
+import threading
+import time
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+slow_query_logger = logging.getLogger('meditrack.slow_query')
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+# Per-endpoint histograms of request wall time, SQL time, query count and
+# template render time, filled from SQLAlchemy cursor events and Flask signals
+class Metrics:
+    SERIES = (
+        ('meditrack_request_duration_seconds', 'Wall time per request', TIME_BUCKETS),
+        ('meditrack_request_sql_seconds', 'Time spent in SQL per request', TIME_BUCKETS),
+        ('meditrack_request_queries', 'SQL statements per request', QUERY_BUCKETS),
+        ('meditrack_request_render_seconds', 'Template render time per request', TIME_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._collectors = []
+        self.slow_query_seconds = None
+
+    def init_app(self, app):
+        if not app.config['METRICS_ENABLED']:
+            return
+        self.slow_query_seconds = app.config['SLOW_QUERY_MS'] / 1000 if app.config['SLOW_QUERY_MS'] else None
+
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', self._after_cursor_execute)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._start_request)
+        app.teardown_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    # Extra lines for /metrics, e.g. cache counters
+    def add_collector(self, collector):
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def _start_request(self):
+        g.metrics = {'started': time.perf_counter(), 'queries': 0, 'sql': 0.0, 'render': 0.0}
+
+    def _finish_request(self, exception=None):
+        state = g.pop('metrics', None)
+        if state is None:
+            return
+        wall = time.perf_counter() - state['started']
+        endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            histograms = self._endpoints.get(endpoint)
+            if histograms is None:
+                histograms = self._endpoints[endpoint] = [Histogram(buckets) for _, _, buckets in self.SERIES]
+            for histogram, value in zip(histograms, (wall, state['sql'], state['queries'], state['render'])):
+                histogram.observe(value)
+
+    # The start time lives on the execution context rather than the connection,
+    # so a statement that fails before after_cursor_execute leaves nothing behind
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        if not has_request_context():
+            return
+        state = g.get('metrics')
+        if state is not None:
+            state['queries'] += 1
+            state['sql'] += elapsed
+        if self.slow_query_seconds is not None and elapsed >= self.slow_query_seconds:
+            slow_query_logger.warning('Slow query (%.1f ms) on %s: %s', elapsed * 1000,
+                                      request.endpoint, ' '.join(statement.split()))
+
+    def _before_render(self, sender, template, context, **extra):
+        state = g.get('metrics')
+        if state is not None:
+            state.setdefault('render_started', []).append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        state = g.get('metrics')
+        if state is not None and state.get('render_started'):
+            state['render'] += time.perf_counter() - state['render_started'].pop()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            for index, (name, description, _) in enumerate(self.SERIES):
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for endpoint, histograms in endpoints:
+                    lines.extend(histograms[index].lines(name, f'endpoint="{endpoint}"'))
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+metrics = Metrics()
@@ -0,0 +1,173 @@
+from database import db
+from search import create_search_index
+from ledger_archive import LEDGERS
+from sqlalchemy.schema import AddConstraint, CreateTable
+import models  # noqa: F401 - registers every table on db.metadata
+
+# Fill columns added to existing tables, keyed by (table, column)
+BACKFILLS = {
+    ('medicine', 'updated_at'): 'UPDATE medicine SET updated_at = created_at',
+    ('daily_sales', 'units'): (
+        'UPDATE daily_sales SET units = (SELECT COALESCE(SUM(quantity), 0) FROM sale '
+        'WHERE sale.user_id = daily_sales.user_id AND date(sale.sale_date) = daily_sales.sale_day)'
+    ),
+}
+
+# Fill tables that create_all just added to an existing database
+TABLE_BACKFILLS = {
+    'daily_sales': (
+        'INSERT INTO daily_sales (user_id, sale_day, sale_count, units, total_amount) '
+        'SELECT user_id, date(sale_date), COUNT(id), SUM(quantity), SUM(total_amount) '
+        'FROM sale GROUP BY user_id, date(sale_date)'
+    ),
+    'medicine_daily_sales': (
+        'INSERT INTO medicine_daily_sales (user_id, sale_day, medicine_id, sale_count, units, total_amount) '
+        'SELECT user_id, date(sale_date), medicine_id, COUNT(id), SUM(quantity), SUM(total_amount) '
+        'FROM sale GROUP BY user_id, date(sale_date), medicine_id'
+    ),
+    'dashboard_summary': (
+        'INSERT INTO dashboard_summary (user_id, total_medicines, total_stock_value, '
+        'expired_medicines, expired_stock_value, inventory_version, inventory_updated_at) '
+        'SELECT id, '
+        '(SELECT COUNT(id) FROM medicine WHERE medicine.user_id = "user".id), '
+        '(SELECT COALESCE(SUM(quantity * price), 0) FROM medicine WHERE medicine.user_id = "user".id), '
+        '(SELECT COUNT(id) FROM expired_medicine WHERE expired_medicine.user_id = "user".id), '
+        '(SELECT COALESCE(SUM(original_value), 0) FROM expired_medicine '
+        'WHERE expired_medicine.user_id = "user".id), '
+        '0, CURRENT_TIMESTAMP FROM "user"'
+    ),
+}
+
+def _add_missing_columns(inspector):
+    added = []
+    preparer = db.engine.dialect.identifier_preparer
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                definition = f'{preparer.format_column(column)} {column.type.compile(dialect=db.engine.dialect)}'
+                if column.server_default is not None:
+                    definition += f" DEFAULT '{column.server_default.arg}'"
+                    if not column.nullable:
+                        definition += ' NOT NULL'
+                connection.exec_driver_sql(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {definition}')
+                if (table.name, column.name) in BACKFILLS:
+                    connection.exec_driver_sql(BACKFILLS[(table.name, column.name)])
+                added.append(f'{table.name}.{column.name}')
+    return added
+
+# Foreign keys the models declare ON DELETE CASCADE on that the database
+# created without it, as (table, constraint, name in the database)
+def _missing_cascades(inspector):
+    missing = []
+    for table in db.metadata.sorted_tables:
+        existing = {tuple(key['constrained_columns']): key for key in inspector.get_foreign_keys(table.name)}
+        for constraint in table.foreign_key_constraints:
+            key = existing.get(tuple(constraint.column_keys))
+            if (constraint.ondelete == 'CASCADE' and key is not None
+                    and (key.get('options', {}).get('ondelete') or '').upper() != 'CASCADE'):
+                missing.append((table, constraint, key['name']))
+    return missing
+
+# SQLite cannot alter a foreign key or add AUTOINCREMENT, so the table is rebuilt from the model
+# and its rows copied across with foreign key checks off. Its indexes are
+# recreated afterwards with the other missing indexes.
+def _rebuild_sqlite_table(table):
+    preparer = db.engine.dialect.identifier_preparer
+    name = preparer.format_table(table)
+    old_name = preparer.quote(f'{table.name}_old')
+    columns = ', '.join(preparer.format_column(column) for column in table.columns)
+    with db.engine.connect() as connection:
+        connection.exec_driver_sql('PRAGMA foreign_keys = OFF')
+        connection.commit()
+        try:
+            connection.exec_driver_sql('BEGIN')
+            connection.exec_driver_sql(f'ALTER TABLE {name} RENAME TO {old_name}')
+            connection.execute(CreateTable(table))
+            connection.exec_driver_sql(f'INSERT INTO {name} ({columns}) SELECT {columns} FROM {old_name}')
+            connection.exec_driver_sql(f'DROP TABLE {old_name}')
+            connection.commit()
+        finally:
+            connection.rollback()
+            connection.exec_driver_sql('PRAGMA foreign_keys = ON')
+            connection.commit()
+
+def _add_cascades(inspector):
+    added = []
+    rebuilt = set()
+    for table, constraint, name in _missing_cascades(inspector):
+        if db.engine.dialect.name == 'sqlite':
+            if table.name not in rebuilt:
+                _rebuild_sqlite_table(table)
+                rebuilt.add(table.name)
+        else:
+            preparer = db.engine.dialect.identifier_preparer
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql(
+                    f'ALTER TABLE {preparer.format_table(table)} DROP CONSTRAINT {preparer.quote(name)}'
+                )
+                connection.execute(AddConstraint(constraint))
+        added.append(f'{table.name}.{",".join(constraint.column_keys)} cascade')
+    return added
+
+# SQLite hands out max(rowid) + 1 for a plain INTEGER PRIMARY KEY, so ids
+# freed by archiving would be reused and clash with the archived copies.
+# Ledger tables made without AUTOINCREMENT are rebuilt with it, and their
+# sequence is moved past the highest archived id.
+def _add_autoincrement():
+    if db.engine.dialect.name != 'sqlite':
+        return []
+    added = []
+    for model, archive_model, _ in LEDGERS:
+        table = model.__table__
+        with db.engine.connect() as connection:
+            sql = connection.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+            ).scalar()
+        if 'AUTOINCREMENT' not in sql.upper():
+            _rebuild_sqlite_table(table)
+            added.append(f'{table.name} autoincrement')
+        with db.engine.begin() as connection:
+            highest = connection.execute(db.select(db.func.max(archive_model.id))).scalar() or 0
+            current = connection.exec_driver_sql(
+                'SELECT seq FROM sqlite_sequence WHERE name = ?', (table.name,)
+            ).scalar()
+            if current is None and highest:
+                connection.exec_driver_sql('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)',
+                                           (table.name, highest))
+            elif current is not None and current < highest:
+                connection.exec_driver_sql('UPDATE sqlite_sequence SET seq = ? WHERE name = ?',
+                                           (highest, table.name))
+    return added
+
+# Bring an existing database up to the current models. create_all only adds
+# missing tables, so columns, cascades, AUTOINCREMENT and indexes added to
+# existing tables are created here.
+def upgrade_database():
+    existing_tables = set(db.inspect(db.engine).get_table_names())
+    db.create_all()
+
+    applied = []
+    with db.engine.begin() as connection:
+        for table, statement in TABLE_BACKFILLS.items():
+            if table not in existing_tables and existing_tables:
+                connection.exec_driver_sql(statement)
+                applied.append(table)
+
+    applied += _add_missing_columns(db.inspect(db.engine))
+    applied += _add_cascades(db.inspect(db.engine))
+    applied += _add_autoincrement()
+
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
+                applied.append(index.name)
+
+    if create_search_index():
+        applied.append('medicine_fts')
+    return applied
@@ -1,13 +1,13 @@
 from database import db
 from flask_login import UserMixin
 from datetime import datetime, date
-from werkzeug.security import generate_password_hash, check_password_hash
+from passwords import password_hasher
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(256))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     medicines = db.relationship('Medicine', backref='user', lazy=True)
@@ -15,12 +15,22 @@ class User(UserMixin, db.Model):
     sales = db.relationship('Sale', backref='user', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
 
 class Medicine(db.Model):
+    __table_args__ = (
+        db.Index('ix_medicine_user_expiry', 'user_id', 'expiry_date'),
+        db.Index('ix_medicine_user_category', 'user_id', 'category'),
+        db.Index('ix_medicine_user_updated', 'user_id', 'updated_at'),
+        db.Index('ix_medicine_user_name', 'user_id', 'name'),
+        # The expiry sweep's watermark and changed-since-last-sweep lookups across all users
+        db.Index('ix_medicine_expiry_quantity', 'expiry_date', 'quantity'),
+        db.Index('ix_medicine_updated', 'updated_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     batch_number = db.Column(db.String(50), nullable=False)
@@ -30,14 +40,22 @@ class Medicine(db.Model):
     expiry_date = db.Column(db.Date, nullable=False)
     low_stock_alert = db.Column(db.Integer, default=10)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
-    transactions = db.relationship('Transaction', backref='medicine', lazy=True)
-    sales = db.relationship('Sale', backref='medicine', lazy=True)
+    transactions = db.relationship('Transaction', backref='medicine', lazy=True, passive_deletes=True)
+    sales = db.relationship('Sale', backref='medicine', lazy=True, passive_deletes=True)
 
 class Transaction(db.Model):
+    __table_args__ = (
+        db.Index('ix_transaction_user_date', 'user_id', 'transaction_date'),
+        db.Index('ix_transaction_medicine_date', 'medicine_id', 'transaction_date'),
+        # Ids are never reused once rows move to the archive, see ledger_archive.py
+        {'sqlite_autoincrement': True},
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
-    medicine_id = db.Column(db.Integer, db.ForeignKey('medicine.id'), nullable=False)
+    medicine_id = db.Column(db.Integer, db.ForeignKey('medicine.id', ondelete='CASCADE'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     transaction_type = db.Column(db.String(10), nullable=False)  # 'in' or 'out'
     quantity = db.Column(db.Integer, nullable=False)
@@ -45,8 +63,14 @@ class Transaction(db.Model):
     notes = db.Column(db.String(200))
 
 class Sale(db.Model):
+    __table_args__ = (
+        db.Index('ix_sale_user_date', 'user_id', 'sale_date'),
+        db.Index('ix_sale_medicine_date', 'medicine_id', 'sale_date'),
+        {'sqlite_autoincrement': True},
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
-    medicine_id = db.Column(db.Integer, db.ForeignKey('medicine.id'), nullable=False)
+    medicine_id = db.Column(db.Integer, db.ForeignKey('medicine.id', ondelete='CASCADE'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     sale_price = db.Column(db.Float, nullable=False)
@@ -55,9 +79,50 @@ class Sale(db.Model):
     sale_date = db.Column(db.DateTime, default=datetime.utcnow)
     notes = db.Column(db.String(200))
 
+# Transactions and sales older than the archive horizon, moved here by
+# ledger_archive.archive_ledger with their ids unchanged
+class ArchivedTransaction(db.Model):
+    __table_args__ = (
+        db.Index('ix_archived_transaction_user_date', 'user_id', 'transaction_date'),
+        db.Index('ix_archived_transaction_medicine_date', 'medicine_id', 'transaction_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    medicine_id = db.Column(db.Integer, db.ForeignKey('medicine.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    transaction_type = db.Column(db.String(10), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    transaction_date = db.Column(db.DateTime)
+    notes = db.Column(db.String(200))
+    
+    medicine = db.relationship('Medicine')
+
+class ArchivedSale(db.Model):
+    __table_args__ = (
+        db.Index('ix_archived_sale_user_date', 'user_id', 'sale_date'),
+        db.Index('ix_archived_sale_medicine_date', 'medicine_id', 'sale_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    medicine_id = db.Column(db.Integer, db.ForeignKey('medicine.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    sale_price = db.Column(db.Float, nullable=False)
+    total_amount = db.Column(db.Float, nullable=False)
+    customer_name = db.Column(db.String(100))
+    sale_date = db.Column(db.DateTime)
+    notes = db.Column(db.String(200))
+    
+    medicine = db.relationship('Medicine')
+
 class ExpiredMedicine(db.Model):
+    __table_args__ = (
+        db.Index('ix_expired_medicine_user_expired_at', 'user_id', 'expired_at'),
+        db.Index('ix_expired_medicine_medicine', 'medicine_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
-    medicine_id = db.Column(db.Integer, db.ForeignKey('medicine.id'), nullable=False)
+    medicine_id = db.Column(db.Integer, db.ForeignKey('medicine.id', ondelete='CASCADE'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     batch_number = db.Column(db.String(50), nullable=False)
@@ -68,4 +133,83 @@ class ExpiredMedicine(db.Model):
     original_value = db.Column(db.Float, nullable=False)
     expired_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    medicine = db.relationship('Medicine', backref='expired_record')
\ No newline at end of file
+    medicine = db.relationship('Medicine', backref=db.backref('expired_record', passive_deletes=True))
+
+class DashboardSummary(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_medicines = db.Column(db.Integer, nullable=False, default=0)
+    total_stock_value = db.Column(db.Float, nullable=False, default=0)
+    expired_medicines = db.Column(db.Integer, nullable=False, default=0)
+    expired_stock_value = db.Column(db.Float, nullable=False, default=0)
+    # Bumped on every medicine write, used as the inventory ETag
+    inventory_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    inventory_updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DailySales(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    sale_day = db.Column(db.Date, primary_key=True)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    total_amount = db.Column(db.Float, nullable=False, default=0)
+
+# Per medicine and day sales, for reports over arbitrary ranges
+class MedicineDailySales(db.Model):
+    __table_args__ = (
+        db.Index('ix_medicine_daily_sales_medicine', 'medicine_id'),
+    )
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    sale_day = db.Column(db.Date, primary_key=True)
+    medicine_id = db.Column(db.Integer, db.ForeignKey('medicine.id', ondelete='CASCADE'), primary_key=True)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0)
+
+class LedgerArchiveRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    cutoff = db.Column(db.DateTime, nullable=False)  # rows dated before this were moved
+    moved_transactions = db.Column(db.Integer, nullable=False, default=0)
+    moved_sales = db.Column(db.Integer, nullable=False, default=0)
+    duration_ms = db.Column(db.Float, nullable=False, default=0)
+
+class ExpirySweep(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    swept_through = db.Column(db.Date, nullable=False)  # medicines expiring before this date are covered
+    moved_count = db.Column(db.Integer, nullable=False, default=0)
+    duration_ms = db.Column(db.Float, nullable=False, default=0)
+    alerts_through = db.Column(db.Date)  # daily expiry alerts were published up to this day
+
+# Quantity of every medicine at taken_at, worked out from the ledger by
+# stock_snapshots.take_stock_snapshot
+class StockSnapshot(db.Model):
+    __table_args__ = (
+        db.Index('ix_stock_snapshot_medicine', 'medicine_id'),
+    )
+    
+    taken_at = db.Column(db.DateTime, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    medicine_id = db.Column(db.Integer, db.ForeignKey('medicine.id', ondelete='CASCADE'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+
+class StockSnapshotRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    taken_at = db.Column(db.DateTime, nullable=False, unique=True)  # stock is as of this time
+    medicines = db.Column(db.Integer, nullable=False, default=0)
+    duration_ms = db.Column(db.Float, nullable=False, default=0)
+
+# Alerts for a user's open event streams. Streams in any process read the
+# rows after the last id they sent; alerts.prune_alerts drops old ones.
+class Alert(db.Model):
+    __table_args__ = (
+        db.Index('ix_alert_user_id', 'user_id', 'id'),
+        # Ids are event ids that browsers resume from, so they are never reused
+        {'sqlite_autoincrement': True},
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON, as sent to the browser
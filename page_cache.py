@@ -0,0 +1,232 @@
+from summary import get_summary
+from flask import Response, make_response, request, session
+from flask_login import current_user
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+from urllib.parse import urlencode
+import hashlib
+import json
+import os
+import threading
+
+# Cached responses are (status, headers, body). Headers that belong to one
+# particular response are not stored.
+SKIPPED_HEADERS = {'content-length', 'set-cookie'}
+
+class MemoryStore:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key, entry):
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.bytes -= len(previous[2])
+        self._entries[key] = entry
+        self.bytes += len(entry[2])
+        while self.bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= len(evicted[2])
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+# One file per entry in a directory that several worker processes can share.
+# Hits refresh the file's mtime and the least recently used files are
+# removed once the directory grows past max_bytes.
+class FileStore:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._written = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as handle:
+                meta = json.loads(handle.readline())
+                body = handle.read()
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return meta['status'], meta['headers'], body
+
+    def set(self, key, entry):
+        status, headers, body = entry
+        path = self._path(key)
+        temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'wb') as handle:
+            handle.write(json.dumps({'status': status, 'headers': headers}).encode() + b'\n')
+            handle.write(body)
+        os.replace(temporary, path)
+        self._written += len(body)
+        if self._written > self.max_bytes // 10:
+            self._written = 0
+            self._prune()
+
+    def _files(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.tmp'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _prune(self):
+        files = sorted(self._files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    @property
+    def bytes(self):
+        return sum(size for _, size, _ in self._files())
+
+    def __len__(self):
+        return len(self._files())
+
+# Rendered pages and JSON keyed by user, path, query arguments, the user's
+# data version and the day. Every write bumps the version (touch_inventory),
+# so entries are never served stale and never need a TTL.
+class PageCache:
+    def __init__(self):
+        self.enabled = False
+        self.max_entry_bytes = 0
+        self.store = MemoryStore(0)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, config):
+        with self._lock:
+            self.enabled = config['PAGE_CACHE_ENABLED']
+            self.max_entry_bytes = config['PAGE_CACHE_MAX_ENTRY_BYTES']
+            if config['PAGE_CACHE_DIR']:
+                self.store = FileStore(config['PAGE_CACHE_DIR'], config['PAGE_CACHE_MAX_BYTES'])
+            else:
+                self.store = MemoryStore(config['PAGE_CACHE_MAX_BYTES'])
+            self.hits = 0
+            self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self.store.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def set(self, key, entry):
+        if len(entry[2]) > self.max_entry_bytes:
+            return
+        with self._lock:
+            self.store.set(key, entry)
+
+    # Remember a fresh response. Streamed bodies are copied as they go out and
+    # stored once complete, unless they grow past max_entry_bytes.
+    def store_response(self, key, response):
+        headers = [(name, value) for name, value in response.headers.items()
+                   if name.lower() not in SKIPPED_HEADERS]
+        if not response.is_streamed:
+            self.set(key, (response.status_code, headers, response.get_data()))
+            return
+        original = response.response
+
+        def copy_chunks():
+            chunks = []
+            size = 0
+            try:
+                for chunk in original:
+                    data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+                    if chunks is not None:
+                        size += len(data)
+                        if size <= self.max_entry_bytes:
+                            chunks.append(data)
+                        else:
+                            chunks = None
+                    yield data
+                if chunks is not None:
+                    self.set(key, (response.status_code, headers, b''.join(chunks)))
+            finally:
+                if hasattr(original, 'close'):
+                    original.close()
+
+        response.response = copy_chunks()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'backend': 'file' if isinstance(self.store, FileStore) else 'memory',
+                'entries': len(self.store),
+                'bytes': self.store.bytes,
+                'max_bytes': self.store.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.store.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0,
+            }
+
+    # Prometheus lines for /metrics
+    def metric_lines(self):
+        stats = self.stats()
+        for name in ('hits', 'misses', 'evictions'):
+            yield f'# TYPE meditrack_page_cache_{name}_total counter'
+            yield f'meditrack_page_cache_{name}_total {stats[name]}'
+        for name in ('entries', 'bytes'):
+            yield f'# TYPE meditrack_page_cache_{name} gauge'
+            yield f'meditrack_page_cache_{name} {stats[name]}'
+
+page_cache = PageCache()
+
+def page_key():
+    version = get_summary(current_user.id).inventory_version
+    args = urlencode(sorted(request.args.items(multi=True)))
+    return f'{current_user.id}|{version}|{date.today()}|{request.path}|{args}'
+
+# Serve a GET view from the page cache. Requests with pending flash messages
+# bypass it, since those are rendered into the page once.
+def cached_page(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not page_cache.enabled or request.method != 'GET' or '_flashes' in session:
+            return view(*args, **kwargs)
+        key = page_key()
+        entry = page_cache.get(key)
+        if entry is not None:
+            status, headers, body = entry
+            response = Response(body, status=status, headers=headers)
+            return response.make_conditional(request) if 'ETag' in response.headers else response
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.direct_passthrough:
+            page_cache.store_response(key, response)
+        return response
+    return wrapper
@@ -0,0 +1,76 @@
+from database import db
+from datetime import datetime, timedelta
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+# Cursors are "<timestamp>_<id>" of the last row on the previous page
+def encode_cursor(moment, row_id):
+    return f'{moment.isoformat()}_{row_id}'
+
+def decode_cursor(cursor):
+    try:
+        moment, row_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(moment), int(row_id)
+    except (AttributeError, ValueError):
+        return None
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+def parse_per_page(value):
+    try:
+        per_page = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PER_PAGE
+    return min(max(per_page, 1), MAX_PER_PAGE)
+
+# Read the shared date-range / medicine / page size filters of the history views
+def history_filters(args):
+    medicine_id = args.get('medicine_id', type=int)
+    return {
+        'start': parse_date(args.get('start')),
+        'end': parse_date(args.get('end')),
+        'medicine_id': medicine_id,
+        'per_page': parse_per_page(args.get('per_page')),
+        'cursor': decode_cursor(args.get('before')),
+        # Non-empty filter arguments to carry over into the next page link
+        'args': {key: args[key] for key in ('start', 'end', 'medicine_id', 'per_page') if args.get(key)},
+    }
+
+def apply_date_range(query, date_column, start, end):
+    if start:
+        query = query.filter(date_column >= start)
+    if end:
+        # End date is inclusive for the user, half-open for the query
+        query = query.filter(date_column < end + timedelta(days=1))
+    return query
+
+def _rows_after(query, date_column, id_column, cursor, limit):
+    if cursor:
+        moment, row_id = cursor
+        query = query.filter(db.or_(
+            date_column < moment,
+            db.and_(date_column == moment, id_column < row_id)
+        ))
+    return query.order_by(date_column.desc(), id_column.desc()).limit(limit).all()
+
+# Newest-first page after the cursor, returns (rows, next_cursor). archive is
+# an optional (query, date_column, id_column) of older rows that the page
+# continues into once the first query runs out.
+def keyset_page(query, date_column, id_column, cursor, per_page, archive=None):
+    rows = _rows_after(query, date_column, id_column, cursor, per_page + 1)
+    if archive is not None and len(rows) <= per_page:
+        if rows:
+            cursor = (getattr(rows[-1], date_column.key), getattr(rows[-1], id_column.key))
+        rows += _rows_after(*archive, cursor, per_page + 1 - len(rows))
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, date_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
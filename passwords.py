@@ -0,0 +1,45 @@
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+# Spell out werkzeug's defaults so 'scrypt' and 'scrypt:32768:8:1' compare equal
+def normalize_method(method):
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = args or (2 ** 15, 8, 1)
+        return f'scrypt:{n}:{r}:{p}'
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    return method
+
+# Password hashing on a small thread pool. hashlib's KDFs release the GIL, so
+# the pool bounds how many hashes burn CPU (and scrypt memory) at once while
+# other requests keep their threads.
+class PasswordHasher:
+    def __init__(self, method='scrypt', workers=2):
+        self._lock = threading.Lock()
+        self._executor = None
+        self.configure(method, workers)
+
+    def configure(self, method, workers):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self.method = normalize_method(method)
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+
+    def hash(self, password):
+        return self._executor.submit(generate_password_hash, password, self.method).result()
+
+    def verify(self, password_hash, password):
+        if not password_hash:
+            return False
+        return self._executor.submit(check_password_hash, password_hash, password).result()
+
+    # Stored hashes made with other parameters are replaced on the next login
+    def needs_rehash(self, password_hash):
+        return normalize_method(password_hash.split('$', 1)[0]) != self.method
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,79 @@
+from database import db
+from models import Medicine
+from page_cache import page_cache
+from sqlalchemy import event
+
+# Tables whose queries must always go through an index
+CHECKED_TABLES = ('user', 'medicine', 'transaction', 'sale', 'expired_medicine',
+                  'dashboard_summary', 'daily_sales', 'medicine_daily_sales',
+                  'archived_transaction', 'archived_sale', 'stock_snapshot')
+
+def hot_routes(medicine_id):
+    routes = [
+        '/dashboard',
+        '/medicines',
+        '/medicines?search=para&category=tablet',
+        '/medicines/table?sort=expiry_date&order=desc&page=2',
+        '/sales',
+        '/sales?start=2024-01-01&end=2024-12-31',
+        '/sales?before=2000-01-01T00:00:00_1',
+        '/transactions',
+        '/transactions?before=2000-01-01T00:00:00_1',
+        '/expired_medicines',
+        '/api/medicines',
+        '/api/reports/sales?start=2024-01-01&end=2024-12-31&interval=month',
+        '/api/inventory/as_of?at=2024-06-30T12:00:00',
+        '/api/inventory/reconcile',
+    ]
+    if medicine_id:
+        routes += [
+            f'/sales?medicine_id={medicine_id}',
+            f'/transactions?medicine_id={medicine_id}',
+            f'/edit_medicine/{medicine_id}',
+            f'/sell_medicine/{medicine_id}',
+        ]
+    return routes
+
+def _full_scans(connection, statement, parameters):
+    scans = []
+    for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters):
+        detail = row[-1]
+        if not detail.startswith('SCAN '):
+            continue
+        table = detail.split()[1].strip('"')
+        if table in CHECKED_TABLES:
+            scans.append(detail)
+    return scans
+
+# Request every hot GET route as the given user, EXPLAIN each SELECT it issued
+# and return (route, statement, plan detail) for every full table scan
+def find_full_scans(app, user):
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+
+    medicine = Medicine.query.filter_by(user_id=user.id).first()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+
+    # Cached pages would hide the queries behind them
+    cache_enabled, page_cache.enabled = page_cache.enabled, False
+    problems = []
+    for route in hot_routes(medicine.id if medicine else None):
+        captured.clear()
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            client.get(route)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+
+        with db.engine.connect() as connection:
+            for statement, parameters in captured:
+                for detail in _full_scans(connection, statement, parameters):
+                    problems.append((route, statement, detail))
+    page_cache.enabled = cache_enabled
+    return problems
@@ -0,0 +1,100 @@
+from database import db
+from models import Medicine, DailySales, MedicineDailySales
+from datetime import timedelta
+
+INTERVALS = ('day', 'week', 'month')
+MAX_BUCKETS = 1000
+MAX_TOP = 50
+
+# First day of the bucket a day falls in; weeks start on Monday
+def bucket_start(day, interval):
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+def next_bucket(day, interval):
+    if interval == 'week':
+        return day + timedelta(days=7)
+    if interval == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+def _empty_buckets(start, end, interval):
+    buckets = {}
+    period = bucket_start(start, interval)
+    while period <= end:
+        if len(buckets) >= MAX_BUCKETS:
+            raise ValueError(f'Range has more than {MAX_BUCKETS} {interval} buckets')
+        buckets[period] = {'period': period.isoformat(), 'sales': 0, 'units': 0, 'revenue': 0}
+        period = next_bucket(period, interval)
+    return buckets
+
+# Best selling medicines by revenue in each category over the range
+def top_medicines(user_id, start, end, top):
+    revenue = db.func.sum(MedicineDailySales.total_amount)
+    ranked = db.select(
+        MedicineDailySales.medicine_id,
+        Medicine.name,
+        Medicine.category,
+        db.func.sum(MedicineDailySales.sale_count).label('sales'),
+        db.func.sum(MedicineDailySales.units).label('units'),
+        revenue.label('revenue'),
+        db.func.row_number().over(partition_by=Medicine.category,
+                                  order_by=(revenue.desc(), MedicineDailySales.medicine_id)).label('rank'),
+    ).join(Medicine, Medicine.id == MedicineDailySales.medicine_id).where(
+        MedicineDailySales.user_id == user_id,
+        MedicineDailySales.sale_day >= start,
+        MedicineDailySales.sale_day <= end,
+    ).group_by(MedicineDailySales.medicine_id, Medicine.name, Medicine.category).subquery()
+
+    rows = db.session.execute(
+        db.select(ranked).where(ranked.c.rank <= top).order_by(ranked.c.category, ranked.c.rank)
+    )
+    result = {}
+    for row in rows:
+        result.setdefault(row.category, []).append({
+            'medicine_id': row.medicine_id,
+            'name': row.name,
+            'sales': row.sales,
+            'units': row.units,
+            'revenue': round(row.revenue, 2),
+        })
+    return result
+
+# Sales, units and revenue per day/week/month between two dates (inclusive),
+# read from the rollup tables so each bucket costs at most one row per day
+def sales_report(user_id, start, end, interval='day', top=5):
+    if interval not in INTERVALS:
+        raise ValueError(f'interval must be one of {", ".join(INTERVALS)}')
+    if start > end:
+        raise ValueError('start must not be after end')
+
+    buckets = _empty_buckets(start, end, interval)
+    days = DailySales.query.filter(
+        DailySales.user_id == user_id,
+        DailySales.sale_day >= start,
+        DailySales.sale_day <= end
+    ).order_by(DailySales.sale_day)
+    for day in days:
+        bucket = buckets[bucket_start(day.sale_day, interval)]
+        bucket['sales'] += day.sale_count
+        bucket['units'] += day.units
+        bucket['revenue'] += day.total_amount
+
+    totals = {'sales': 0, 'units': 0, 'revenue': 0}
+    for bucket in buckets.values():
+        for key in totals:
+            totals[key] += bucket[key]
+        bucket['revenue'] = round(bucket['revenue'], 2)
+    totals['revenue'] = round(totals['revenue'], 2)
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'interval': interval,
+        'buckets': list(buckets.values()),
+        'totals': totals,
+        'top_medicines': top_medicines(user_id, start, end, top) if top else {},
+    }
@@ -0,0 +1,115 @@
+from database import db
+from models import Medicine
+from sqlalchemy import DDL, event
+import re
+
+# Full-text index over medicine name, batch number and category. It is an
+# external-content FTS5 table kept in sync by triggers, so raw SQL writes are
+# indexed as well as ORM ones. Other databases fall back to ILIKE. The owner's
+# user_id is indexed too and every query matches it, so FTS5 only looks at
+# (and bm25 only ranks) that user's rows.
+
+SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS medicine_fts USING fts5(
+        name, batch_number, category, user_id,
+        content='medicine', content_rowid='id', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS medicine_fts_insert AFTER INSERT ON medicine BEGIN
+        INSERT INTO medicine_fts(rowid, name, batch_number, category, user_id)
+        VALUES (new.id, new.name, new.batch_number, new.category, new.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS medicine_fts_delete AFTER DELETE ON medicine BEGIN
+        INSERT INTO medicine_fts(medicine_fts, rowid, name, batch_number, category, user_id)
+        VALUES ('delete', old.id, old.name, old.batch_number, old.category, old.user_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS medicine_fts_update AFTER UPDATE OF name, batch_number, category ON medicine BEGIN
+        INSERT INTO medicine_fts(medicine_fts, rowid, name, batch_number, category, user_id)
+        VALUES ('delete', old.id, old.name, old.batch_number, old.category, old.user_id);
+        INSERT INTO medicine_fts(rowid, name, batch_number, category, user_id)
+        VALUES (new.id, new.name, new.batch_number, new.category, new.user_id);
+    END""",
+]
+
+for statement in SEARCH_DDL:
+    event.listen(Medicine.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+# Field prefixes accepted in a query, e.g. "batch:B12 para"
+SEARCH_FIELDS = {'name': 'name', 'batch': 'batch_number', 'category': 'category'}
+
+# Columns that unqualified terms are matched against
+TEXT_COLUMNS = '{name batch_number category}'
+
+# bm25 weights for name, batch_number, category, user_id
+RANK_WEIGHTS = (10.0, 5.0, 1.0, 0.0)
+
+medicine_fts = db.table('medicine_fts', db.column('rowid'))
+fts_match = db.literal_column('medicine_fts')
+
+def uses_fts():
+    return db.engine.dialect.name == 'sqlite'
+
+# Create the index on an existing database and fill it from the medicine
+# table. An index made before user_id was indexed is dropped and rebuilt.
+def create_search_index():
+    if not uses_fts():
+        return False
+    with db.engine.begin() as connection:
+        existing = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE name = 'medicine_fts'"
+        ).scalar()
+        created = existing is None or 'UNINDEXED' in existing.upper()
+        if existing is not None and created:
+            connection.exec_driver_sql('DROP TABLE medicine_fts')
+            for trigger in ('insert', 'delete', 'update'):
+                connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS medicine_fts_{trigger}')
+        for statement in SEARCH_DDL:
+            connection.exec_driver_sql(statement)
+        if created:
+            connection.exec_driver_sql("INSERT INTO medicine_fts(medicine_fts) VALUES ('rebuild')")
+    return created
+
+def rebuild_search_index():
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO medicine_fts(medicine_fts) VALUES ('rebuild')")
+
+# Turn user input into an FTS5 query over one user's medicines: every term is
+# a quoted prefix match and all terms must match. Returns None when nothing
+# searchable is left.
+def build_match_query(search, user_id):
+    terms = []
+    for token in search.split():
+        field, _, term = token.rpartition(':')
+        column = SEARCH_FIELDS.get(field.lower())
+        term = re.sub(r'[^\w]', ' ', term if column else token).split()
+        if not term:
+            continue
+        phrase = ' '.join(f'"{part}"' for part in term) + '*'
+        terms.append(f'{column or TEXT_COLUMNS} : ({phrase})')
+    if not terms:
+        return None
+    return ' AND '.join([f'user_id : "{int(user_id)}"'] + terms)
+
+# Narrow a query on user_id's medicines to those matching `search`
+def filter_by_search(query, search, user_id):
+    if not uses_fts():
+        return query.filter(Medicine.name.ilike(f'%{search}%'))
+    match = build_match_query(search, user_id)
+    if match is None:
+        return query
+    return query.filter(Medicine.id.in_(
+        db.select(medicine_fts.c.rowid).where(fts_match.op('MATCH')(match))
+    ))
+
+# Best ranked medicines of a user for a typeahead query
+def search_medicines(user_id, search, limit):
+    query = Medicine.query.filter(Medicine.user_id == user_id)
+    if not uses_fts():
+        return query.filter(Medicine.name.ilike(f'%{search}%')).order_by(Medicine.name).limit(limit).all()
+    match = build_match_query(search, user_id)
+    if match is None:
+        return []
+    # Rank inside the index and only load the medicines that made the cut
+    ranked = db.select(
+        medicine_fts.c.rowid, db.func.bm25(fts_match, *RANK_WEIGHTS).label('rank')
+    ).where(fts_match.op('MATCH')(match)).order_by('rank').limit(limit).subquery()
+    return query.join(ranked, ranked.c.rowid == Medicine.id).order_by(ranked.c.rank).all()
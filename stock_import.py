@@ -0,0 +1,143 @@
+from database import db
+from models import Medicine, Transaction
+from summary import adjust_summary, touch_inventory
+from datetime import datetime, date
+import csv
+import io
+import json
+import time
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+JSON_READ_SIZE = 64 * 1024
+# Largest single object accepted in a JSON import
+JSON_MAX_OBJECT_SIZE = 1024 * 1024
+
+# Same rules as the add medicine form, raises ValueError with a message for the user
+def validate_medicine(data, today=None):
+    values = {}
+    for field in ('name', 'batch_number', 'category', 'quantity', 'price', 'expiry_date'):
+        value = data.get(field)
+        if value is None or str(value).strip() == '':
+            raise ValueError(f'Missing {field}')
+        values[field] = str(value).strip()
+
+    try:
+        values['quantity'] = int(values['quantity'])
+        values['price'] = float(values['price'])
+        values['low_stock_alert'] = int(data.get('low_stock_alert') or 10)
+    except ValueError:
+        raise ValueError('Quantity, price and low stock alert must be numbers')
+
+    try:
+        values['expiry_date'] = datetime.strptime(values['expiry_date'], '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError('Expiry date must be in YYYY-MM-DD format')
+
+    if values['expiry_date'] <= (today or date.today()):
+        raise ValueError('Expiry date must be greater than current date')
+    return values
+
+def iter_csv_rows(stream):
+    yield from csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+
+# Read objects one at a time from a JSON array or from JSON Lines without
+# loading the whole file. An object that still does not parse once
+# JSON_MAX_OBJECT_SIZE of input is buffered stops the import there, so a
+# malformed file never pulls the rest of itself into memory.
+def iter_json_rows(stream):
+    reader = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        # Skip the array brackets, separators and whitespace between objects
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+            position += 1
+        if position < len(buffer):
+            try:
+                row, position = decoder.raw_decode(buffer, position)
+                yield row
+                continue
+            except json.JSONDecodeError:
+                if eof or len(buffer) - position > JSON_MAX_OBJECT_SIZE:
+                    raise ValueError('Invalid JSON near: ' + buffer[position:position + 50])
+        elif eof:
+            return
+        # Need more input, keep only the unread tail of the buffer
+        chunk = reader.read(JSON_READ_SIZE)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+def iter_import_rows(stream, file_format):
+    if file_format == 'csv':
+        return iter_csv_rows(stream)
+    if file_format == 'json':
+        return iter_json_rows(stream)
+    raise ValueError('Unsupported file format, use CSV or JSON')
+
+def detect_format(filename):
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    return {'csv': 'csv', 'json': 'json', 'jsonl': 'json', 'ndjson': 'json'}.get(extension)
+
+def _write_chunk(user_id, chunk):
+    now = datetime.utcnow()
+    medicine_ids = db.session.scalars(
+        db.insert(Medicine).returning(Medicine.id, sort_by_parameter_order=True),
+        [dict(values, user_id=user_id, created_at=now, updated_at=now) for values in chunk]
+    ).all()
+    db.session.execute(db.insert(Transaction), [
+        {
+            'medicine_id': medicine_id,
+            'user_id': user_id,
+            'transaction_type': 'in',
+            'quantity': values['quantity'],
+            'transaction_date': now,
+            'notes': 'Initial stock added (import)'
+        }
+        for medicine_id, values in zip(medicine_ids, chunk)
+    ])
+    adjust_summary(user_id,
+                   total_medicines=len(chunk),
+                   total_stock_value=sum(values['quantity'] * values['price'] for values in chunk))
+    touch_inventory(user_id)
+    db.session.commit()
+
+# Validate and insert rows in chunks, one transaction per chunk.
+# Returns a report with per-row errors (row numbers start at 1).
+def import_medicines(user_id, rows, chunk_size=IMPORT_CHUNK_SIZE):
+    started = time.perf_counter()
+    today = date.today()
+    report = {'imported': 0, 'failed': 0, 'errors': []}
+    chunk = []
+
+    try:
+        for row_number, row in enumerate(rows, start=1):
+            try:
+                if not isinstance(row, dict):
+                    raise ValueError('Row must be an object')
+                chunk.append(validate_medicine(row, today))
+            except ValueError as error:
+                report['failed'] += 1
+                if len(report['errors']) < MAX_REPORTED_ERRORS:
+                    report['errors'].append({'row': row_number, 'error': str(error)})
+                continue
+
+            if len(chunk) >= chunk_size:
+                _write_chunk(user_id, chunk)
+                report['imported'] += len(chunk)
+                chunk = []
+    except (ValueError, UnicodeDecodeError, csv.Error) as error:
+        # The file itself could not be read any further
+        report['errors'].append({'row': None, 'error': str(error)})
+
+    if chunk:
+        _write_chunk(user_id, chunk)
+        report['imported'] += len(chunk)
+
+    elapsed = time.perf_counter() - started
+    report['seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round((report['imported'] + report['failed']) / elapsed, 1) if elapsed else 0
+    return report
@@ -0,0 +1,136 @@
+from database import db
+from models import Medicine, Transaction, ArchivedTransaction, StockSnapshot, StockSnapshotRun
+from datetime import datetime, timedelta, timezone
+import time
+
+# 'in' adds to stock and 'out' takes from it
+def _signed_quantity(model):
+    return db.case((model.transaction_type == 'in', model.quantity), else_=-model.quantity).label('quantity')
+
+# Parse an as-of timestamp; naive values are UTC like the ledger dates and a
+# bare date means the start of that day
+def parse_as_of(value):
+    at = datetime.fromisoformat(value)
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    return at
+
+def latest_snapshot(at=None):
+    statement = db.select(db.func.max(StockSnapshotRun.taken_at))
+    if at is not None:
+        statement = statement.where(StockSnapshotRun.taken_at <= at)
+    return db.session.scalar(statement)
+
+# Statement giving (user_id, medicine_id, quantity) of every medicine with
+# stock history as of `at` (None for now): the nearest earlier snapshot plus
+# the archived and live ledger rows dated after it. full=True ignores the
+# snapshots and replays the whole ledger. Returns the snapshot used as well.
+def ledger_quantities(at=None, user_id=None, full=False):
+    base = None if full else latest_snapshot(at)
+    parts = []
+    if base is not None:
+        snapshot = db.select(StockSnapshot.user_id, StockSnapshot.medicine_id, StockSnapshot.quantity).where(
+            StockSnapshot.taken_at == base
+        )
+        if user_id is not None:
+            snapshot = snapshot.where(StockSnapshot.user_id == user_id)
+        parts.append(snapshot)
+    for model in (ArchivedTransaction, Transaction):
+        movements = db.select(model.user_id, model.medicine_id, _signed_quantity(model))
+        if user_id is not None:
+            movements = movements.where(model.user_id == user_id)
+        if base is not None:
+            movements = movements.where(model.transaction_date > base)
+        if at is not None:
+            movements = movements.where(model.transaction_date <= at)
+        parts.append(movements)
+
+    rows = db.union_all(*parts).subquery()
+    statement = db.select(
+        rows.c.user_id, rows.c.medicine_id, db.func.sum(rows.c.quantity).label('quantity')
+    ).group_by(rows.c.user_id, rows.c.medicine_id)
+    return base, statement
+
+# A user's inventory as it stood at `at`
+def stock_as_of(user_id, at):
+    base, statement = ledger_quantities(at, user_id)
+    quantities = statement.subquery()
+    rows = db.session.execute(
+        db.select(Medicine.id, Medicine.name, Medicine.batch_number, Medicine.category, quantities.c.quantity)
+        .join(quantities, quantities.c.medicine_id == Medicine.id)
+        .order_by(Medicine.name, Medicine.id)
+    ).all()
+    return {
+        'as_of': at.isoformat(),
+        'snapshot': base.isoformat() if base else None,
+        'total_items': sum(row.quantity for row in rows),
+        'medicines': [{
+            'id': row.id,
+            'name': row.name,
+            'batch_number': row.batch_number,
+            'category': row.category,
+            'quantity': row.quantity,
+        } for row in rows],
+    }
+
+# Medicines whose stored quantity differs from what the ledger adds up to
+def reconcile_stock(user_id, full=False):
+    base, statement = ledger_quantities(user_id=user_id, full=full)
+    quantities = statement.subquery()
+    ledger_quantity = db.func.coalesce(quantities.c.quantity, 0)
+    rows = db.session.execute(
+        db.select(Medicine.id, Medicine.name, Medicine.batch_number, Medicine.quantity,
+                  ledger_quantity.label('ledger_quantity'))
+        .outerjoin(quantities, quantities.c.medicine_id == Medicine.id)
+        .where(Medicine.user_id == user_id, Medicine.quantity != ledger_quantity)
+        .order_by(Medicine.name, Medicine.id)
+    ).all()
+    return {
+        'snapshot': base.isoformat() if base else None,
+        'drift': [{
+            'id': row.id,
+            'name': row.name,
+            'batch_number': row.batch_number,
+            'quantity': row.quantity,
+            'ledger_quantity': row.ledger_quantity,
+            'difference': row.quantity - row.ledger_quantity,
+        } for row in rows],
+    }
+
+# Drop snapshots older than keep_days, except the first one of each month
+def prune_stock_snapshots(keep_days):
+    cutoff = datetime.utcnow() - timedelta(days=keep_days)
+    months = set()
+    dropped = []
+    for run in StockSnapshotRun.query.filter(StockSnapshotRun.taken_at < cutoff).order_by(StockSnapshotRun.taken_at):
+        month = (run.taken_at.year, run.taken_at.month)
+        if month in months:
+            dropped.append(run.taken_at)
+        months.add(month)
+    for taken_at in dropped:
+        db.session.execute(db.delete(StockSnapshot).where(StockSnapshot.taken_at == taken_at))
+        db.session.execute(db.delete(StockSnapshotRun).where(StockSnapshotRun.taken_at == taken_at))
+    return len(dropped)
+
+# Record every medicine's quantity as of `at` (default the start of the
+# current UTC day) for all users, from the previous snapshot and the ledger
+# rows since. Returns None if that snapshot already exists.
+def take_stock_snapshot(at=None, keep_days=None):
+    started = time.perf_counter()
+    at = at or datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    if StockSnapshotRun.query.filter_by(taken_at=at).first() is not None:
+        return None
+
+    _, statement = ledger_quantities(at)
+    quantities = statement.subquery()
+    result = db.session.execute(db.insert(StockSnapshot).from_select(
+        ['taken_at', 'user_id', 'medicine_id', 'quantity'],
+        db.select(db.literal(at, db.DateTime), quantities.c.user_id, quantities.c.medicine_id, quantities.c.quantity)
+    ))
+    run = StockSnapshotRun(taken_at=at, medicines=result.rowcount)
+    if keep_days is not None:
+        prune_stock_snapshots(keep_days)
+    run.duration_ms = (time.perf_counter() - started) * 1000
+    db.session.add(run)
+    db.session.commit()
+    return run
@@ -0,0 +1,220 @@
+from database import db
+from sqlalchemy.dialects import postgresql, sqlite
+from models import Medicine, Sale, ArchivedSale, ExpiredMedicine, DashboardSummary, DailySales, MedicineDailySales
+from datetime import datetime
+
+# Dashboard counters kept in step with the base tables. Every write path calls
+# these helpers before its own commit so the summary moves in the same transaction.
+
+SUMMARY_FIELDS = ('total_medicines', 'total_stock_value', 'expired_medicines', 'expired_stock_value')
+
+# INSERT ... ON CONFLICT on the dialects that have it, so concurrent writers
+# never race to create the same row
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+def _insert_or_ignore(model, values):
+    statement = UPSERT_INSERTS[db.engine.dialect.name](model).values(**values)
+    return db.session.execute(statement.on_conflict_do_nothing()).rowcount
+
+# New users start with an empty summary row in the signup transaction
+def create_summary(user_id):
+    _insert_or_ignore(DashboardSummary, dict(user_id=user_id, total_medicines=0, total_stock_value=0,
+                                             expired_medicines=0, expired_stock_value=0, inventory_version=0,
+                                             inventory_updated_at=datetime.utcnow()))
+
+# A user without a summary row (one made before the table existed, or removed
+# by hand) gets one from the base tables. That happens in touch_inventory,
+# which every write path calls after its last base table write, so the counts
+# already include the write; adjust_summary leaves the row alone until then
+# rather than add a delta to counts it cannot trust.
+def adjust_summary(user_id, **deltas):
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas or db.session.get(DashboardSummary, user_id) is None:
+        return
+    db.session.execute(
+        db.update(DashboardSummary)
+        .where(DashboardSummary.user_id == user_id)
+        .values({getattr(DashboardSummary, field): getattr(DashboardSummary, field) + delta
+                 for field, delta in deltas.items()})
+    )
+
+# Mark the user's data as changed. The version is the /api/medicines ETag
+# and part of every page cache key, so every write path must call this.
+def touch_inventory(user_id):
+    if db.session.get(DashboardSummary, user_id) is None and _insert_or_ignore(
+            DashboardSummary, dict(user_id=user_id, inventory_version=1, inventory_updated_at=datetime.utcnow(),
+                                   **compute_summary(user_id))):
+        return
+    db.session.execute(
+        db.update(DashboardSummary)
+        .where(DashboardSummary.user_id == user_id)
+        .values(inventory_version=DashboardSummary.inventory_version + 1,
+                inventory_updated_at=datetime.utcnow())
+    )
+
+# Add to a rollup row, creating it if it does not exist, in one statement
+def _add_to_bucket(model, key, count, units, amount):
+    statement = UPSERT_INSERTS[db.engine.dialect.name](model).values(
+        sale_count=count, units=units, total_amount=amount, **key
+    )
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=list(key),
+        set_={'sale_count': model.sale_count + statement.excluded.sale_count,
+              'units': model.units + statement.excluded.units,
+              'total_amount': model.total_amount + statement.excluded.total_amount}
+    ))
+
+# Add freshly inserted sale rows (dicts with medicine_id, quantity and
+# total_amount) to the day and per medicine rollups
+def record_sale(user_id, sales, sale_date=None):
+    sale_day = (sale_date or datetime.utcnow()).date()
+    by_medicine = {}
+    for sale in sales:
+        bucket = by_medicine.setdefault(sale['medicine_id'], [0, 0, 0])
+        bucket[0] += 1
+        bucket[1] += sale['quantity']
+        bucket[2] += sale['total_amount']
+
+    _add_to_bucket(DailySales, {'user_id': user_id, 'sale_day': sale_day}, len(sales),
+                   sum(sale['quantity'] for sale in sales), sum(sale['total_amount'] for sale in sales))
+    for medicine_id, (count, units, amount) in by_medicine.items():
+        _add_to_bucket(MedicineDailySales, {'user_id': user_id, 'sale_day': sale_day, 'medicine_id': medicine_id},
+                       count, units, amount)
+
+# Take the sales of the medicines in medicine_ids (a list or a select of ids)
+# out of the daily rollup in one UPDATE, before the medicines are deleted.
+# Their per medicine rollup rows go with them through ON DELETE CASCADE.
+def forget_medicine_sales(user_id, medicine_ids):
+    removed = db.select(
+        MedicineDailySales.sale_day,
+        db.func.sum(MedicineDailySales.sale_count).label('sale_count'),
+        db.func.sum(MedicineDailySales.units).label('units'),
+        db.func.sum(MedicineDailySales.total_amount).label('total_amount')
+    ).where(
+        MedicineDailySales.user_id == user_id,
+        MedicineDailySales.medicine_id.in_(medicine_ids)
+    ).group_by(MedicineDailySales.sale_day).subquery()
+    db.session.execute(
+        db.update(DailySales).where(
+            DailySales.user_id == user_id,
+            DailySales.sale_day == removed.c.sale_day
+        ).values(
+            sale_count=DailySales.sale_count - removed.c.sale_count,
+            units=DailySales.units - removed.c.units,
+            total_amount=DailySales.total_amount - removed.c.total_amount
+        ),
+        execution_options={'synchronize_session': False}
+    )
+
+def get_summary(user_id):
+    summary = db.session.get(DashboardSummary, user_id)
+    if summary is None:
+        rebuild_summary(user_id)
+        db.session.commit()
+        summary = db.session.get(DashboardSummary, user_id)
+    return summary
+
+def get_day_sales(user_id, sale_day):
+    bucket = db.session.get(DailySales, (user_id, sale_day))
+    return bucket.total_amount if bucket else 0
+
+def get_total_sales(user_id):
+    return db.session.query(db.func.coalesce(db.func.sum(DailySales.total_amount), 0)).filter(
+        DailySales.user_id == user_id
+    ).scalar()
+
+# Recompute a user's counters straight from the base tables
+def compute_summary(user_id):
+    total_medicines, total_stock_value = db.session.query(
+        db.func.count(Medicine.id),
+        db.func.coalesce(db.func.sum(Medicine.quantity * Medicine.price), 0)
+    ).filter(Medicine.user_id == user_id).one()
+
+    expired_medicines, expired_stock_value = db.session.query(
+        db.func.count(ExpiredMedicine.id),
+        db.func.coalesce(db.func.sum(ExpiredMedicine.original_value), 0)
+    ).filter(ExpiredMedicine.user_id == user_id).one()
+
+    return {
+        'total_medicines': total_medicines,
+        'total_stock_value': total_stock_value,
+        'expired_medicines': expired_medicines,
+        'expired_stock_value': expired_stock_value,
+    }
+
+# date() gives a string on SQLite and a date on PostgreSQL
+def _parse_day(day):
+    return datetime.strptime(day, '%Y-%m-%d').date() if isinstance(day, str) else day
+
+# Sale totals grouped by day (and medicine), over live and archived sales
+def _grouped_sales(user_id, by_medicine):
+    totals = {}
+    for model in (Sale, ArchivedSale):
+        keys = [db.func.date(model.sale_date)] + ([model.medicine_id] if by_medicine else [])
+        rows = db.session.query(
+            *keys, db.func.count(model.id), db.func.sum(model.quantity), db.func.sum(model.total_amount)
+        ).filter(model.user_id == user_id).group_by(*keys)
+        for row in rows:
+            key = (_parse_day(row[0]), row[1]) if by_medicine else _parse_day(row[0])
+            count, units, amount = totals.get(key, (0, 0, 0))
+            totals[key] = (count + row[-3], units + row[-2], amount + row[-1])
+    return totals
+
+def compute_daily_sales(user_id):
+    return _grouped_sales(user_id, by_medicine=False)
+
+def compute_medicine_daily_sales(user_id):
+    return _grouped_sales(user_id, by_medicine=True)
+
+def rebuild_summary(user_id):
+    # Keep the inventory version moving forward so old ETags never match again
+    previous = db.session.get(DashboardSummary, user_id)
+    version = previous.inventory_version + 1 if previous else 0
+    db.session.execute(db.delete(DashboardSummary).where(DashboardSummary.user_id == user_id))
+    db.session.execute(db.delete(DailySales).where(DailySales.user_id == user_id))
+    db.session.execute(db.delete(MedicineDailySales).where(MedicineDailySales.user_id == user_id))
+    db.session.add(DashboardSummary(user_id=user_id, inventory_version=version,
+                                    inventory_updated_at=datetime.utcnow(), **compute_summary(user_id)))
+    days = [
+        {'user_id': user_id, 'sale_day': sale_day, 'sale_count': count, 'units': units, 'total_amount': amount}
+        for sale_day, (count, units, amount) in compute_daily_sales(user_id).items()
+    ]
+    if days:
+        db.session.execute(db.insert(DailySales), days)
+    buckets = [
+        {'user_id': user_id, 'sale_day': sale_day, 'medicine_id': medicine_id,
+         'sale_count': count, 'units': units, 'total_amount': amount}
+        for (sale_day, medicine_id), (count, units, amount) in compute_medicine_daily_sales(user_id).items()
+    ]
+    if buckets:
+        db.session.execute(db.insert(MedicineDailySales), buckets)
+    db.session.flush()
+
+def _compare_buckets(problems, label, stored, expected):
+    for key, totals in expected.items():
+        found = stored.pop(key, None)
+        if found is None or found[:2] != totals[:2] or round(found[2], 2) != round(totals[2], 2):
+            problems.append((f'{label} {key}', found, totals))
+    for key, found in stored.items():
+        if found[0]:
+            problems.append((f'{label} {key}', found, (0, 0, 0)))
+
+# Compare the stored counters with the base tables, returns a list of mismatches
+def check_summary(user_id):
+    problems = []
+    summary = db.session.get(DashboardSummary, user_id)
+    expected = compute_summary(user_id)
+    for field in SUMMARY_FIELDS:
+        stored = getattr(summary, field) if summary else None
+        if stored is None or round(stored, 2) != round(expected[field], 2):
+            problems.append((field, stored, expected[field]))
+
+    _compare_buckets(problems, 'sales', {
+        bucket.sale_day: (bucket.sale_count, bucket.units, bucket.total_amount)
+        for bucket in DailySales.query.filter_by(user_id=user_id)
+    }, compute_daily_sales(user_id))
+    _compare_buckets(problems, 'medicine sales', {
+        (bucket.sale_day, bucket.medicine_id): (bucket.sale_count, bucket.units, bucket.total_amount)
+        for bucket in MedicineDailySales.query.filter_by(user_id=user_id)
+    }, compute_medicine_daily_sales(user_id))
+    return problems
@@ -0,0 +1,88 @@
+from models import User
+from flask_login import UserMixin
+from sqlalchemy import event
+from collections import OrderedDict
+import threading
+import time
+
+# Identity handed to Flask-Login for cached users. It holds only the plain
+# columns requests need, so it never has to be attached to a session.
+class CachedUser(UserMixin):
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.created_at = user.created_at
+
+# Bounded LRU of users by id with a time to live, so load_user doesn't run a
+# SELECT on every request. Entries are dropped as soon as the user row changes.
+class UserCache:
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, max_size, ttl):
+        with self._lock:
+            self.max_size = max_size
+            self.ttl = ttl
+            self._entries.clear()
+
+    def get(self, user_id, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        user = loader(user_id)
+        if user is None or self.max_size <= 0:
+            return user
+        cached = CachedUser(user)
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, cached)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return cached
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0,
+            }
+
+    # Prometheus lines for /metrics
+    def metric_lines(self):
+        stats = self.stats()
+        for name in ('hits', 'misses', 'evictions'):
+            yield f'# TYPE meditrack_user_cache_{name}_total counter'
+            yield f'meditrack_user_cache_{name}_total {stats[name]}'
+        yield '# TYPE meditrack_user_cache_size gauge'
+        yield f'meditrack_user_cache_size {stats["size"]}'
+
+user_cache = UserCache()
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user(mapper, connection, target):
+    user_cache.invalidate(target.id)
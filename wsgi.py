@@ -0,0 +1,29 @@
+# WSGI entry point for multi-process servers, for example
+#
+#     gunicorn --workers 4 --worker-class gthread --threads 32 --preload wsgi:app
+#
+# Every open tab keeps an alert stream open on a worker thread, so use a
+# threaded worker class with threads to spare for them; a sync worker would
+# be taken by one tab. Alerts go through the alert table, so they reach
+# streams in every worker. Nothing here creates or migrates the schema: run
+# `flask --app app upgrade-db` when deploying, and
+# `flask --app app run-scheduler` as one separate process for the daily
+# expiry sweep, alerts and stock snapshots.
+from app import create_app, warm_templates
+from config import DEFAULT_SECRET_KEY
+from database import db
+
+app = create_app()
+
+if app.config['SECRET_KEY'] == DEFAULT_SECRET_KEY:
+    raise RuntimeError('Set the SECRET_KEY environment variable before serving the app')
+
+# Fail at start-up rather than on the first request when upgrade-db has not run
+with app.app_context():
+    missing = set(db.metadata.tables) - set(db.inspect(db.engine).get_table_names())
+    # Connections must not be shared with the forked workers
+    db.engine.dispose()
+if missing:
+    raise RuntimeError(f'Missing tables {", ".join(sorted(missing))}, run `flask --app app upgrade-db` first')
+
+warm_templates(app)